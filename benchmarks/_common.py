@@ -0,0 +1,52 @@
+import random
+import statistics
+import timeit
+import typing as t
+
+from mtgorp.db.database import CardDatabase
+from mtgorp.db.load import PickleLoader
+from mtgorp.models.persistent.printing import Printing
+
+from magiccube.collections.cube import Cube
+from magiccube.laps.traps.trap import IntentionType, Trap
+from magiccube.laps.traps.tree.printingtree import AllNode
+
+
+def load_db() -> CardDatabase:
+    return PickleLoader().load()
+
+
+def sample_printings(db: CardDatabase, amount: int, rng: random.Random) -> t.List[Printing]:
+    return rng.sample(sorted(db.printings.values(), key=lambda printing: printing.id), amount)
+
+
+def sample_cube(db: CardDatabase, printing_amount: int, trap_amount: int, rng: random.Random) -> Cube:
+    """
+    A cube of printing_amount distinct printings and trap_amount traps of two printings each, a third of them garbage.
+    """
+    printings = sample_printings(db, printing_amount + 2 * trap_amount, rng)
+    return Cube(
+        printings[:printing_amount]
+        + [
+            Trap(
+                AllNode(printings[printing_amount + 2 * index : printing_amount + 2 * index + 2]),
+                IntentionType.GARBAGE if index % 3 == 0 else IntentionType.SYNERGY,
+            )
+            for index in range(trap_amount)
+        ]
+    )
+
+
+def measure(statement: t.Callable[[], t.Any], *, number: int, repeat: int = 5) -> float:
+    """
+    Median seconds per call of statement over repeat runs of number calls.
+    """
+    return statistics.median(timeit.repeat(statement, number=number, repeat=repeat)) / number
+
+
+def report(name: str, baseline: float, current: float) -> None:
+    print(f"{name:<40} {baseline * 1e3:>10.3f} ms {current * 1e3:>10.3f} ms {baseline / current:>7.2f}x")
+
+
+def report_header() -> None:
+    print(f"{'':<40} {'baseline':>13} {'current':>13} {'speedup':>8}")
@@ -0,0 +1,83 @@
+"""
+Compares the cost of the first access to each type view of a fresh Cube, and to all six of them, between scanning the
+cubeables once per view, as BaseCube did before the views were partitioned in a single pass, and BaseCube._partition,
+which the first access to any view now runs.
+
+    python benchmarks/cube_partition.py
+"""
+import random
+import typing as t
+
+from _common import load_db, measure, report, report_header, sample_cube
+from orp.models import OrpBase
+from yeetlong.multiset import FrozenMultiset
+
+from magiccube.collections.cube import Cube
+from magiccube.laps.lap import BaseLap
+from magiccube.laps.purples.purple import BasePurple
+from magiccube.laps.tickets.ticket import BaseTicket
+from magiccube.laps.traps.trap import BaseTrap, IntentionType
+
+
+BASELINE_VIEWS: t.Dict[str, t.Callable[[Cube], FrozenMultiset]] = {
+    "models": lambda cube: FrozenMultiset(cubeable for cubeable in cube.cubeables if isinstance(cubeable, OrpBase)),
+    "traps": lambda cube: FrozenMultiset(cubeable for cubeable in cube.cubeables if isinstance(cubeable, BaseTrap)),
+    "garbage_traps": lambda cube: FrozenMultiset(
+        cubeable
+        for cubeable in cube.cubeables
+        if (isinstance(cubeable, BaseTrap) and cubeable.intention_type == IntentionType.GARBAGE)
+    ),
+    "tickets": lambda cube: FrozenMultiset(
+        cubeable for cubeable in cube.cubeables if isinstance(cubeable, BaseTicket)
+    ),
+    "purples": lambda cube: FrozenMultiset(
+        cubeable for cubeable in cube.cubeables if isinstance(cubeable, BasePurple)
+    ),
+    "laps": lambda cube: FrozenMultiset(cubeable for cubeable in cube.cubeables if isinstance(cubeable, BaseLap)),
+}
+
+
+def baseline_first_access(cube: Cube, view: str) -> FrozenMultiset:
+    return BASELINE_VIEWS[view](Cube(cube.cubeables))
+
+
+def first_access(cube: Cube, view: str) -> FrozenMultiset:
+    return getattr(Cube(cube.cubeables), view)
+
+
+def baseline_all_views(cube: Cube) -> t.List[FrozenMultiset]:
+    fresh = Cube(cube.cubeables)
+    return [scan(fresh) for scan in BASELINE_VIEWS.values()]
+
+
+def all_views(cube: Cube) -> t.List[FrozenMultiset]:
+    fresh = Cube(cube.cubeables)
+    return [getattr(fresh, view) for view in BASELINE_VIEWS]
+
+
+def main() -> None:
+    db = load_db()
+    rng = random.Random(0)
+
+    report_header()
+    for printing_amount, trap_amount in ((90, 0), (360, 90), (720, 360)):
+        cube = sample_cube(db, printing_amount, trap_amount, rng)
+        print(f"{printing_amount} printings, {trap_amount} traps")
+
+        for view in BASELINE_VIEWS:
+            assert baseline_first_access(cube, view) == first_access(cube, view)
+            report(
+                f"  first access to {view}",
+                measure(lambda: baseline_first_access(cube, view), number=200),
+                measure(lambda: first_access(cube, view), number=200),
+            )
+
+        report(
+            "  first access to all views",
+            measure(lambda: baseline_all_views(cube), number=200),
+            measure(lambda: all_views(cube), number=200),
+        )
+
+
+if __name__ == "__main__":
+    main()
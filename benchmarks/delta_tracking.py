@@ -0,0 +1,143 @@
+"""
+Compares DeltaDistributor.mutate on a DistributionDelta that tracks its modified trap indexes incrementally against
+one that chains the modified and valid trap index sets together from every source on each lookup, as
+DistributionDelta did before the tracked containers.
+
+    python benchmarks/delta_tracking.py
+"""
+import itertools
+import random
+import typing as t
+
+from _common import load_db, measure, report, report_header, sample_printings
+from evolution import environment
+from evolution.environment import EvolutionModelBlueprint
+from mtgorp.db.database import CardDatabase
+
+from magiccube.collections.laps import TrapCollection
+from magiccube.collections.nodecollection import ConstrainedNode
+from magiccube.laps.traps.distribute.algorithm import (
+    DetachedDistributionNode,
+    DistributionNode,
+)
+from magiccube.laps.traps.distribute.delta import DeltaDistributor, DistributionDelta
+from magiccube.laps.traps.trap import IntentionType, Trap
+from magiccube.laps.traps.tree.printingtree import AllNode
+
+
+class UntrackedDistributionDelta(DistributionDelta):
+    def _track(self, node_moves, added_node_indexes, removed_trap_redistributions) -> None:
+        self._all_index_set = frozenset(range(self.trap_amount))
+        self._node_moves = dict(node_moves)
+        self._added_node_indexes = dict(added_node_indexes)
+        self._removed_trap_redistributions = {
+            index: list(indexes) for index, indexes in removed_trap_redistributions.items()
+        }
+
+    @property
+    def node_moves(self) -> t.Dict[t.Tuple[int, int], int]:
+        return self._node_moves
+
+    @node_moves.setter
+    def node_moves(self, node_moves: t.Mapping[t.Tuple[int, int], int]) -> None:
+        self._node_moves = dict(node_moves)
+
+    @property
+    def added_node_indexes(self) -> t.Dict[DetachedDistributionNode, int]:
+        return self._added_node_indexes
+
+    @added_node_indexes.setter
+    def added_node_indexes(self, added_node_indexes: t.Mapping[DetachedDistributionNode, int]) -> None:
+        self._added_node_indexes = dict(added_node_indexes)
+
+    @property
+    def removed_trap_redistributions(self) -> t.Dict[int, t.List[int]]:
+        return self._removed_trap_redistributions
+
+    @removed_trap_redistributions.setter
+    def removed_trap_redistributions(self, removed_trap_redistributions: t.Mapping[int, t.Iterable[int]]) -> None:
+        self._removed_trap_redistributions = {
+            index: list(indexes) for index, indexes in removed_trap_redistributions.items()
+        }
+
+    @property
+    def modified_trap_indexes(self) -> t.FrozenSet[int]:
+        return (
+            frozenset(
+                itertools.chain(
+                    self._removed_node_indexes,
+                    (index for index, _ in self.node_moves),
+                    self.node_moves.values(),
+                    self.added_node_indexes.values(),
+                    range(self._origin.trap_amount, self._origin.trap_amount + self._trap_amount_delta),
+                    *self.removed_trap_redistributions.values(),
+                )
+            )
+            - self.removed_trap_redistributions.keys()
+        )
+
+    @property
+    def valid_trap_indexes(self) -> t.FrozenSet[int]:
+        return self._all_index_set - self.removed_trap_redistributions.keys()
+
+
+class UntrackedDeltaDistributor(DeltaDistributor):
+    def create_individual(self) -> DistributionDelta:
+        return UntrackedDistributionDelta(
+            origin=self._original_distribution,
+            added_nodes=self._added,
+            removed_node_indexes=frozenset(_index for _, _index in self._removed),
+            max_trap_difference=self._max_trap_delta,
+            trap_amount_delta=self._trap_amount - len(self._original_collection),
+            node_table=self._delta_node_table,
+            rng=self._random,
+        )
+
+
+def create_distributor(
+    distributor_type: t.Type[DeltaDistributor],
+    db: CardDatabase,
+    node_amount: int,
+    trap_amount: int,
+    trap_amount_delta: int,
+    seed: int,
+) -> DeltaDistributor:
+    """
+    A distributor from a collection of trap_amount traps over node_amount printings towards trap_amount +
+    trap_amount_delta traps, with the last twentieth of the collection's printings removed and two new ones added.
+    """
+    rng = random.Random(seed)
+    printings = sample_printings(db, node_amount + 2, rng)
+    collection = TrapCollection(
+        Trap(AllNode(printings[index:node_amount:trap_amount]), IntentionType.GARBAGE) for index in range(trap_amount)
+    )
+    return distributor_type(
+        [
+            DistributionNode(ConstrainedNode(rng.choice((0.5, 1.0, 2.0)), AllNode((printing,)), ()))
+            for printing in printings[: node_amount - node_amount // 20] + printings[node_amount:]
+        ],
+        collection,
+        trap_amount + trap_amount_delta,
+        lambda distribution: (),
+        trap_amount // 3,
+        EvolutionModelBlueprint(environment.SimpleModel, initial_population_size=2),
+        rng=rng,
+    )
+
+
+def main() -> None:
+    db = load_db()
+    report_header()
+    for node_amount, trap_amount, trap_amount_delta in ((80, 10, 0), (360, 45, -2), (720, 90, 3)):
+        timings = []
+        for distributor_type in (UntrackedDeltaDistributor, DeltaDistributor):
+            distributor = create_distributor(distributor_type, db, node_amount, trap_amount, trap_amount_delta, 0)
+            delta = distributor.create_individual()
+            timings.append(measure(lambda: distributor.mutate(delta), number=2000))
+        # The incrementally tracked indexes still agree with the chained ones after the mutations.
+        assert UntrackedDistributionDelta.modified_trap_indexes.fget(delta) == delta.modified_trap_indexes
+        report(f"{node_amount} nodes, {trap_amount}{trap_amount_delta:+d} traps", *timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures the memory a population of trap distributions takes per individual with tracemalloc, before and after they
+are scored by the four distribution constraints. Compares TrapDistribution, an ArrayTrapDistribution caching its
+aggregates in an array and a set of dirty traps per key, as ArrayTrapDistribution did before, and
+ArrayTrapDistribution.
+
+    python benchmarks/distribution_memory.py
+"""
+import random
+import tracemalloc
+import typing as t
+
+import numpy as np
+
+from magiccube.laps.traps.distribute.algorithm import (
+    DetachedDistributionNode,
+    DistributionNodeTable,
+    GroupExclusivityConstraint,
+    ImageAmountHomogeneity,
+    NodeContribution,
+    SizeHomogeneityConstraint,
+    TrapCollectionIndividual,
+    TrapDistribution,
+    ValueDistributionHomogeneityConstraint,
+)
+from magiccube.laps.traps.distribute.compact import (
+    ASSIGNMENT_DTYPE,
+    ArrayTrapDistribution,
+)
+
+
+POPULATION_SIZE = 300
+GROUPS = tuple("abcdefghij")
+
+
+class KeyedArrayTrapDistribution(ArrayTrapDistribution):
+    def __init__(self, node_table: DistributionNodeTable, trap_amount: int, assignment: np.ndarray):
+        super().__init__(node_table, trap_amount, assignment)
+        self._trap_aggregates: t.Dict[t.Hashable, np.ndarray] = {}
+        self._dirty_traps: t.Dict[t.Hashable, t.Set[int]] = {}
+
+    def touch(self, *trap_indexes: int) -> None:
+        for dirty_traps in self._dirty_traps.values():
+            dirty_traps.update(trap_indexes)
+
+    def trap_aggregates(
+        self,
+        key: t.Hashable,
+        aggregate: t.Callable[[DistributionNodeTable, np.ndarray], float],
+        contribution: t.Optional[NodeContribution] = None,
+    ) -> np.ndarray:
+        aggregates = self._trap_aggregates.get(key)
+
+        if aggregates is None:
+            aggregates = self._trap_aggregates[key] = np.array(
+                [aggregate(self._node_table, self.trap_member_indexes(index)) for index in range(self._trap_amount)],
+                dtype=float,
+            )
+            self._dirty_traps[key] = set()
+
+        else:
+            dirty_traps = self._dirty_traps[key]
+            for index in dirty_traps:
+                aggregates[index] = aggregate(self._node_table, self.trap_member_indexes(index))
+            dirty_traps.clear()
+
+        return aggregates
+
+
+def bytes_per_individual(
+    create: t.Callable[[], TrapCollectionIndividual],
+    constraints: t.Sequence,
+    scored: bool,
+) -> float:
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        population = [create() for _ in range(POPULATION_SIZE)]
+        if scored:
+            for individual in population:
+                for constraint in constraints:
+                    constraint.score(individual)
+        return (tracemalloc.get_traced_memory()[0] - start) / len(population)
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    rng = random.Random(0)
+    print(f"{'':<60} {'unscored':>10} {'scored':>10}")
+    for node_amount, trap_amount in ((80, 10), (360, 45), (720, 90)):
+        node_table = DistributionNodeTable(
+            DetachedDistributionNode(
+                value=rng.choice((0.5, 1.0, 2.0)),
+                groups=frozenset(rng.sample(GROUPS, 2)),
+                image_amount=1,
+            )
+            for _ in range(node_amount)
+        )
+        constraints = [
+            ValueDistributionHomogeneityConstraint(node_table.nodes, trap_amount),
+            GroupExclusivityConstraint(node_table.nodes, trap_amount, {}),
+            SizeHomogeneityConstraint(node_table.nodes, trap_amount),
+            ImageAmountHomogeneity(node_table.nodes, trap_amount),
+        ]
+        # Build the node table's shared collision matrix outside of the measurements.
+        for constraint in constraints:
+            constraint.score(TrapDistribution(node_table.nodes, trap_amount, node_table=node_table))
+
+        def random_assignment() -> np.ndarray:
+            return np.array([rng.randrange(trap_amount) for _ in range(node_amount)], dtype=ASSIGNMENT_DTYPE)
+
+        for name, create in (
+            (
+                "TrapDistribution",
+                lambda: TrapDistribution(
+                    node_table.nodes,
+                    trap_amount,
+                    random_initialization=True,
+                    node_table=node_table,
+                    rng=rng,
+                ),
+            ),
+            (
+                "keyed ArrayTrapDistribution",
+                lambda: KeyedArrayTrapDistribution(node_table, trap_amount, random_assignment()),
+            ),
+            ("ArrayTrapDistribution", lambda: ArrayTrapDistribution(node_table, trap_amount, random_assignment())),
+        ):
+            print(
+                f"{f'{node_amount} nodes, {trap_amount} traps, {name}':<60}"
+                f" {bytes_per_individual(create, constraints, False):>8.0f} B"
+                f" {bytes_per_individual(create, constraints, True):>8.0f} B"
+            )
+
+
+if __name__ == "__main__":
+    main()
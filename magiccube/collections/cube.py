@@ -3,16 +3,12 @@ from __future__ import annotations
 import itertools
 import typing as t
 from abc import abstractmethod
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 
+import numpy as np
 from mtgorp.models.interfaces import Cardboard, Printing
-from mtgorp.models.serilization.serializeable import (
-    Inflator,
-    PersistentHashable,
-    serialization_model,
-)
+from mtgorp.models.serilization.serializeable import Inflator, serialization_model
 from mtgorp.tools.search.pattern import Pattern
-from numpy.random import choice
 from orp.models import OrpBase
 from yeetlong.multiset import FrozenMultiset, Multiset
 
@@ -24,7 +20,9 @@ from magiccube.collections.cubeable import (
     Cubeable,
     CubeableCollection,
     cardboardize,
+    cubeable_digest,
 )
+from magiccube.collections.digest import DigestHashable, combine_digests
 from magiccube.laps.lap import BaseLap, CardboardLap, Lap
 from magiccube.laps.purples.purple import BasePurple, CardboardPurple, Purple
 from magiccube.laps.tickets.ticket import BaseTicket, CardboardTicket, Ticket
@@ -38,13 +36,53 @@ I = t.TypeVar("I", bound=BaseTicket)
 P = t.TypeVar("P", bound=BasePurple)
 L = t.TypeVar("L", bound=BaseLap)
 
+_VIEWS = ("_models", "_traps", "_garbage_traps", "_tickets", "_purples", "_laps")
+
+
+def _cubeable_views(cubeable: BaseCubeable) -> t.Tuple[str, ...]:
+    if isinstance(cubeable, OrpBase):
+        return ("_models",)
+    if isinstance(cubeable, BaseTrap):
+        if cubeable.intention_type == IntentionType.GARBAGE:
+            return "_traps", "_garbage_traps", "_laps"
+        return "_traps", "_laps"
+    if isinstance(cubeable, BaseTicket):
+        return "_tickets", "_laps"
+    if isinstance(cubeable, BasePurple):
+        return "_purples", "_laps"
+    if isinstance(cubeable, BaseLap):
+        return ("_laps",)
+    return ()
+
+
+class BaseCube(BaseCubeableCollection, DigestHashable, t.Generic[C, M, T, I, P, L]):
+    """
+    Cubes derived from another cube by adding or subtracting a cubeable collection are stored as their parent plus an
+    overlay of the multiplicities the collection changes, so deriving costs time proportional to the collection, not
+    the cube. The full multiset is only built the first time something needs it, and typed views are updated from the
+    parent's views, if it has them, the first time one is accessed.
+
+    Overlays are chained at most MAX_OVERLAY_DEPTH deep, after which the parent is materialized before deriving from
+    it, so multiplicity lookups stay bounded and long derivation chains do not keep every intermediate cube alive.
+    """
+
+    MAX_OVERLAY_DEPTH = 16
 
-class BaseCube(BaseCubeableCollection, PersistentHashable, t.Generic[C, M, T, I, P, L]):
     def __init__(
         self,
         cubeables: t.Union[t.Iterable[C], t.Iterable[t.Tuple[C, int]], t.Mapping[C, int], None] = None,
     ):
-        self._cubeables = FrozenMultiset() if cubeables is None else FrozenMultiset(cubeables)
+        self._cubeables: t.Optional[FrozenMultiset[C]] = (
+            FrozenMultiset()
+            if cubeables is None
+            else (cubeables if isinstance(cubeables, FrozenMultiset) else FrozenMultiset(cubeables))
+        )
+
+        self._parent: t.Optional[BaseCube] = None
+        self._overlay: t.Optional[t.Dict[C, int]] = None
+        self._differences: t.Optional[t.List[t.Tuple[C, int]]] = None
+        self._depth = 0
+        self._length: t.Optional[int] = None
 
         self._models: t.Optional[FrozenMultiset[M]] = None
         self._traps: t.Optional[FrozenMultiset[T]] = None
@@ -55,54 +93,156 @@ class BaseCube(BaseCubeableCollection, PersistentHashable, t.Generic[C, M, T, I,
 
     @property
     def items(self) -> t.Iterable[C]:
-        return self._cubeables
+        return self.cubeables
+
+    def _multiplicity(self, cubeable: C) -> int:
+        cube = self
+        while cube._cubeables is None:
+            try:
+                return cube._overlay[cubeable]
+            except KeyError:
+                cube = cube._parent
+        return cube._cubeables.elements().get(cubeable, 0)
+
+    def _materialize(self) -> None:
+        chain = []
+        cube = self
+        while cube._cubeables is None:
+            chain.append(cube)
+            cube = cube._parent
+
+        elements: Multiset[C] = Multiset(cube._cubeables)
+        for derived in reversed(chain):
+            for cubeable, difference in derived._differences:
+                if difference > 0:
+                    elements.add(cubeable, difference)
+                else:
+                    elements.remove(cubeable, -difference)
+
+        self._cubeables = FrozenMultiset(elements)
+        self._overlay = None
+        self._depth = 0
+        self._release_parent()
+
+    def _release_parent(self) -> None:
+        if self._cubeables is not None and self._models is not None:
+            self._parent = None
+            self._differences = None
+
+    def _partition(self) -> None:
+        parent = self._parent
+
+        if parent is not None and parent._models is not None:
+            view_changes: t.Dict[str, t.Dict[C, int]] = defaultdict(dict)
+
+            for cubeable, difference in self._differences:
+                for view in _cubeable_views(cubeable):
+                    view_changes[view][cubeable] = difference
+
+            for view in _VIEWS:
+                previous_view = getattr(parent, view)
+                changes = view_changes.get(view)
+                if not changes:
+                    setattr(self, view, previous_view)
+                    continue
+
+                updated_view = Multiset(previous_view)
+                for cubeable, difference in changes.items():
+                    if difference > 0:
+                        updated_view.add(cubeable, difference)
+                    else:
+                        updated_view.remove(cubeable, -difference)
+                setattr(self, view, FrozenMultiset(updated_view))
+
+        else:
+            views: t.Dict[str, t.Dict[C, int]] = {view: {} for view in _VIEWS}
+
+            for cubeable, multiplicity in self.cubeables.items():
+                for view in _cubeable_views(cubeable):
+                    views[view][cubeable] = multiplicity
+
+            for view, elements in views.items():
+                setattr(self, view, FrozenMultiset(elements))
+
+        self._release_parent()
+
+    def _derive(self: B, changes: t.Iterable[t.Tuple[C, int]]) -> B:
+        """
+        This cube with the multiplicity of each cubeable in changes offset by its amount, floored at zero, in time
+        proportional to the number of changes.
+        """
+        if self._depth >= self.MAX_OVERLAY_DEPTH:
+            self._materialize()
+
+        overlay: t.Dict[C, int] = {}
+        differences: t.List[t.Tuple[C, int]] = []
+
+        for cubeable, amount in changes:
+            previous = overlay[cubeable] if cubeable in overlay else self._multiplicity(cubeable)
+            multiplicity = max(previous + amount, 0)
+            if multiplicity != previous:
+                overlay[cubeable] = multiplicity
+                differences.append((cubeable, multiplicity - previous))
+
+        if not differences:
+            return self
+
+        derived = self.__class__()
+        derived._cubeables = None
+        derived._parent = self
+        derived._overlay = overlay
+        derived._differences = differences
+        derived._depth = self._depth + 1
+        derived._length = len(self) + sum(difference for _, difference in differences)
+
+        if self._digest is not None:
+            derived._digest = combine_digests(
+                ((cubeable_digest(cubeable), difference) for cubeable, difference in differences),
+                self._digest,
+            )
+
+        return derived
 
     @property
     def models(self) -> FrozenMultiset[M]:
         if self._models is None:
-            self._models = FrozenMultiset(cubeable for cubeable in self._cubeables if isinstance(cubeable, OrpBase))
+            self._partition()
         return self._models
 
     @property
     def cubeables(self) -> FrozenMultiset[C]:
+        if self._cubeables is None:
+            self._materialize()
         return self._cubeables
 
     @property
     def traps(self) -> FrozenMultiset[T]:
         if self._traps is None:
-            self._traps = FrozenMultiset(cubeable for cubeable in self._cubeables if isinstance(cubeable, BaseTrap))
+            self._partition()
         return self._traps
 
     @property
     def garbage_traps(self) -> FrozenMultiset[T]:
         if self._garbage_traps is None:
-            self._garbage_traps = FrozenMultiset(
-                cubeable
-                for cubeable in self._cubeables
-                if (isinstance(cubeable, BaseTrap) and cubeable.intention_type == IntentionType.GARBAGE)
-            )
+            self._partition()
         return self._garbage_traps
 
     @property
     def tickets(self) -> FrozenMultiset[I]:
         if self._tickets is None:
-            self._tickets = FrozenMultiset(
-                cubeable for cubeable in self._cubeables if isinstance(cubeable, BaseTicket)
-            )
+            self._partition()
         return self._tickets
 
     @property
     def purples(self) -> FrozenMultiset[P]:
         if self._purples is None:
-            self._purples = FrozenMultiset(
-                cubeable for cubeable in self._cubeables if isinstance(cubeable, BasePurple)
-            )
+            self._partition()
         return self._purples
 
     @property
     def laps(self) -> FrozenMultiset[L]:
         if self._laps is None:
-            self._laps = FrozenMultiset(cubeable for cubeable in self._cubeables if isinstance(cubeable, BaseLap))
+            self._partition()
         return self._laps
 
     @property
@@ -122,13 +262,13 @@ class BaseCube(BaseCubeableCollection, PersistentHashable, t.Generic[C, M, T, I,
         return self.__class__(
             cubeables=(
                 cubeable
-                for cubeable in self._cubeables
+                for cubeable in self.cubeables
                 if (isinstance(cubeable, OrpBase) and pattern.match(cubeable))
                 or (isinstance(cubeable, t.Iterable) and any(pattern.matches(cubeable)))
             ),
         )
 
-    def scale(self, amount: int) -> BaseCube:
+    def scale(self, amount: int, rng: t.Optional[np.random.Generator] = None) -> BaseCube:
         current_size = len(self)
 
         if not current_size:
@@ -151,14 +291,17 @@ class BaseCube(BaseCubeableCollection, PersistentHashable, t.Generic[C, M, T, I,
                 factored[cubeable] = remainder
 
         s = sum(factored.values())
+        candidates = list(factored.keys())
+        rng = np.random.default_rng() if rng is None else rng
 
         return (
             self
             + self.__class__(additionals)
             + (
                 self.__class__(
-                    choice(
-                        list(factored.keys()),
+                    candidates[index]
+                    for index in rng.choice(
+                        len(candidates),
                         remaining - len(additionals),
                         replace=False,
                         p=[v / s for v in factored.values()],
@@ -170,10 +313,12 @@ class BaseCube(BaseCubeableCollection, PersistentHashable, t.Generic[C, M, T, I,
         )
 
     def __iter__(self) -> t.Iterator[C]:
-        return self._cubeables.__iter__()
+        return self.cubeables.__iter__()
 
     def __len__(self) -> int:
-        return len(self._cubeables)
+        if self._length is None:
+            self._length = len(self.cubeables)
+        return self._length
 
     @abstractmethod
     def serialize(self) -> serialization_model:
@@ -184,27 +329,41 @@ class BaseCube(BaseCubeableCollection, PersistentHashable, t.Generic[C, M, T, I,
     def deserialize(cls, value: serialization_model, inflator: Inflator) -> BaseCube:
         pass
 
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        return ((cubeable_digest(cubeable), multiplicity) for cubeable, multiplicity in self.cubeables.items())
+
     def _calc_persistent_hash(self) -> t.Iterable[t.ByteString]:
         for model in sorted(self.models, key=lambda _printing: _printing.id):
             yield str(model.id).encode("ASCII")
         for persistent_hash in sorted(lap.persistent_hash() for lap in self.laps):
             yield persistent_hash.encode("ASCII")
 
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        state = self.__dict__.copy()
+        state.update(
+            _cubeables=self.cubeables,
+            _parent=None,
+            _overlay=None,
+            _differences=None,
+            _depth=0,
+        )
+        return state
+
     def __hash__(self) -> int:
-        return hash(self._cubeables)
+        return hash(self.cubeables)
 
     def __eq__(self, other: object) -> bool:
-        return isinstance(other, self.__class__) and self._cubeables == other._cubeables
+        return isinstance(other, self.__class__) and self.cubeables == other.cubeables
 
     def __add__(self, other: t.Union[BaseCubeableCollection, t.Iterable[Cubeable]]) -> BaseCube:
         if isinstance(other, BaseCubeableCollection):
-            return self.__class__(self._cubeables + other.items)
-        return self.__class__(self._cubeables + other)
+            return self._derive(other.items.items())
+        return self.__class__(self.cubeables + other)
 
     def __sub__(self, other: t.Union[BaseCubeableCollection, t.Iterable[Cubeable]]) -> BaseCube:
         if isinstance(other, BaseCubeableCollection):
-            return self.__class__(self._cubeables - other.items)
-        return self.__class__(self._cubeables - other)
+            return self._derive((cubeable, -multiplicity) for cubeable, multiplicity in other.items.items())
+        return self.__class__(self.cubeables - other)
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.__hash__()})"
@@ -219,7 +378,7 @@ class CardboardCube(
 ):
     @property
     def cardboard_cubeables(self) -> FrozenMultiset[CardboardCubeable]:
-        return self._cubeables
+        return self.cubeables
 
     @property
     def cardboards(self) -> FrozenMultiset[Cardboard]:
@@ -260,12 +419,12 @@ class Cube(
     @property
     def as_cardboards(self) -> CardboardCube:
         return CardboardCube(
-            ((cardboardize(cubeable), multiplicity) for cubeable, multiplicity in self._cubeables.items())
+            ((cardboardize(cubeable), multiplicity) for cubeable, multiplicity in self.cubeables.items())
         )
 
     @property
     def cubeables(self) -> FrozenMultiset[Cubeable]:
-        return self._cubeables
+        return super().cubeables
 
     @property
     def printings(self) -> FrozenMultiset[Printing]:
@@ -14,6 +14,7 @@ from mtgorp.models.serilization.serializeable import (
 from mtgorp.models.serilization.strategies.jsonid import JsonId
 from mtgorp.models.serilization.strategies.raw import RawStrategy
 
+from magiccube.collections.digest import element_digest
 from magiccube.laps.lap import CardboardLap, Lap
 from magiccube.laps.purples.purple import CardboardPurple, Purple
 from magiccube.laps.tickets.ticket import CardboardTicket, Ticket
@@ -100,6 +101,12 @@ def deserialize_cardboard_node_child(node_child: t.Any, inflator: Inflator) -> C
     return CardboardNode.deserialize(node_child, inflator)
 
 
+def cubeable_digest(cubeable: BaseCubeable) -> int:
+    return element_digest(
+        str(cubeable.id) if isinstance(cubeable, (Printing, Cardboard)) else cubeable.persistent_hash()
+    )
+
+
 def cardboardize(cubeable: Cubeable) -> CardboardCubeable:
     if isinstance(cubeable, Printing):
         return cubeable.cardboard
@@ -5,16 +5,17 @@ import logging
 import typing as t
 
 from mtgorp.models.interfaces import Cardboard, Printing
-from mtgorp.models.serilization.serializeable import (
-    Inflator,
-    PersistentHashable,
-    serialization_model,
-)
+from mtgorp.models.serilization.serializeable import Inflator, serialization_model
 from yeetlong.counters import FrozenCounter
 from yeetlong.multiset import FrozenMultiset
 
 from magiccube.collections.cube import Cube, Cubeable
-from magiccube.collections.cubeable import BaseCubeable, CubeableCollection
+from magiccube.collections.cubeable import (
+    BaseCubeable,
+    CubeableCollection,
+    cubeable_digest,
+)
+from magiccube.collections.digest import DIGEST_MODULUS, DigestHashable
 from magiccube.laps.lap import Lap
 from magiccube.laps.purples.purple import Purple
 from magiccube.laps.tickets.ticket import Ticket
@@ -97,7 +98,7 @@ class CubeDelta(object):
         )
 
 
-class CubeDeltaOperation(CubeableCollection, PersistentHashable):
+class CubeDeltaOperation(CubeableCollection, DigestHashable):
     def __init__(
         self,
         cubeables: t.Union[None, t.Mapping[Cubeable, int], t.Iterable[Cubeable]] = None,
@@ -246,6 +247,14 @@ class CubeDeltaOperation(CubeableCollection, PersistentHashable):
             }
         )
 
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        return ((cubeable_digest(cubeable), multiplicity) for cubeable, multiplicity in self._cubeables.items())
+
+    def _with_digest(self, digest: t.Optional[int]) -> CubeDeltaOperation:
+        if digest is not None:
+            self._digest = digest % DIGEST_MODULUS
+        return self
+
     def _calc_persistent_hash(self) -> t.Iterable[t.ByteString]:
         for printing, multiplicity in sorted(self.printings, key=lambda pair: pair[0].id):
             yield str(printing.id).encode("ASCII")
@@ -258,22 +267,28 @@ class CubeDeltaOperation(CubeableCollection, PersistentHashable):
             yield str(multiplicity).encode("ASCII")
 
     def __add__(self, other: t.Union[CubeDeltaOperation, Cube]) -> CubeDeltaOperation:
-        return self.__class__(self._cubeables + other.cubeables)
+        return self.__class__(self._cubeables + other.cubeables)._with_digest(
+            None if self._digest is None or other._digest is None else self._digest + other._digest
+        )
 
     __radd__ = __add__
 
     def __sub__(self, other: t.Union[CubeDeltaOperation, Cube]) -> CubeDeltaOperation:
-        return self.__class__(self._cubeables - other.cubeables)
+        return self.__class__(self._cubeables - other.cubeables)._with_digest(
+            None if self._digest is None or other._digest is None else self._digest - other._digest
+        )
 
     __rsub__ = __sub__
 
     def __mul__(self, other: int) -> CubeDeltaOperation:
-        return self.__class__(self._cubeables * other)
+        return self.__class__(self._cubeables * other)._with_digest(
+            None if self._digest is None else self._digest * other
+        )
 
     __rmul__ = __mul__
 
     def __invert__(self):
-        return self.__class__(self._cubeables * -1)
+        return self.__class__(self._cubeables * -1)._with_digest(None if self._digest is None else -self._digest)
 
     def __hash__(self) -> int:
         return hash(self._cubeables)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import typing as t
+from abc import abstractmethod
+from enum import Enum
+
+from mtgorp.models.serilization.serializeable import PersistentHashable
+
+
+DIGEST_MODULUS = 1 << 256
+
+
+class PersistentHashVersion(Enum):
+    SORTED = 1
+    DIGEST = 2
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def element_digest(key: str) -> int:
+    return int.from_bytes(hashlib.sha256(key.encode("UTF-8")).digest(), "big")
+
+
+def combine_digests(digests: t.Iterable[t.Tuple[int, int]], initial: int = 0) -> int:
+    return (initial + sum(digest * multiplicity for digest, multiplicity in digests)) % DIGEST_MODULUS
+
+
+def format_digest(digest: int) -> str:
+    return f"v{PersistentHashVersion.DIGEST.value}-{digest:064x}"
+
+
+def get_persistent_hash_version(persistent_hash: str) -> PersistentHashVersion:
+    if persistent_hash.startswith("v"):
+        version, _, _ = persistent_hash[1:].partition("-")
+        return PersistentHashVersion(int(version))
+    return PersistentHashVersion.SORTED
+
+
+class DigestHashable(PersistentHashable):
+    """
+    Persistent hash of a multiset like collection, calculated as the sum of the digests of its elements weighted by
+    multiplicity. The sum does not depend on element order, so derived collections can update it from the elements of
+    a delta alone.
+
+    persistent_hash_version selects the hashing scheme. Digest hashes are prefixed with their version, anything else
+    is a hash from the sorted _calc_persistent_hash scheme, which verify_persistent_hash still accepts.
+    """
+
+    persistent_hash_version = PersistentHashVersion.DIGEST
+
+    _digest: t.Optional[int] = None
+
+    @abstractmethod
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        pass
+
+    @property
+    def digest(self) -> int:
+        if self._digest is None:
+            self._digest = combine_digests(self._element_digests())
+        return self._digest
+
+    def sorted_persistent_hash(self) -> str:
+        """
+        Persistent hash from the sorted _calc_persistent_hash scheme, regardless of persistent_hash_version. Containers
+        whose own persistent hash is built from the hashes of digest hashables use this, so their hashes stay the same
+        as those stored before digest hashes were introduced.
+        """
+        return super().persistent_hash()
+
+    def persistent_hash(self) -> str:
+        if self.persistent_hash_version == PersistentHashVersion.SORTED:
+            return self.sorted_persistent_hash()
+        return format_digest(self.digest)
+
+    def verify_persistent_hash(self, persistent_hash: str) -> bool:
+        if get_persistent_hash_version(persistent_hash) == PersistentHashVersion.SORTED:
+            return self.sorted_persistent_hash() == persistent_hash
+        return format_digest(self.digest) == persistent_hash
@@ -15,12 +15,17 @@ from yeetlong.multiset import FrozenMultiset
 
 from magiccube.collections.cube import BaseCube, CardboardCube, Cube
 from magiccube.collections.cubeable import Cubeable
+from magiccube.collections.digest import DigestHashable, element_digest
 
 
 C = t.TypeVar("C", bound=BaseCube)
 
 
-class BaseFantasySet(Serializeable, PersistentHashable, t.Generic[C]):
+class BaseFantasySet(Serializeable, DigestHashable, t.Generic[C]):
+    """
+    Digest hashed from the digests of its cubes by rarity. Hashes from the sorted scheme still verify.
+    """
+
     def __init__(self, rarity_map: t.Mapping[str, C]):
         self._rarity_map: t.Mapping[str, C] = immutabledict(rarity_map)
 
@@ -42,10 +47,13 @@ class BaseFantasySet(Serializeable, PersistentHashable, t.Generic[C]):
     def __eq__(self, other: object) -> bool:
         return isinstance(other, self.__class__) and self._rarity_map == other._rarity_map
 
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        return ((element_digest(f"{rarity}:{cube.digest:064x}"), 1) for rarity, cube in self._rarity_map.items())
+
     def _calc_persistent_hash(self) -> t.Iterator[t.ByteString]:
         for k, v in sorted(self._rarity_map.items(), key=lambda p: p[0]):
             yield k.encode("UTF-8")
-            yield v.persistent_hash().encode("ASCII")
+            yield v.sorted_persistent_hash().encode("ASCII")
 
     def __repr__(self) -> str:
         return "{}({})".format(
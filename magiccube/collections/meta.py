@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import typing as t
+
 from mtgorp.models.serilization.serializeable import (
     Inflator,
+    PersistentHashable,
     Serializeable,
     serialization_model,
 )
@@ -11,7 +14,7 @@ from magiccube.collections.infinites import Infinites
 from magiccube.collections.nodecollection import GroupMap, NodeCollection
 
 
-class MetaCube(Serializeable):
+class MetaCube(Serializeable, PersistentHashable):
     def __init__(self, cube: Cube, nodes: NodeCollection, groups: GroupMap, infinites: Infinites):
         self._cube = cube
         self._nodes = nodes
@@ -51,6 +54,15 @@ class MetaCube(Serializeable):
             Infinites.deserialize(value["infinites"], inflator),
         )
 
+    def _calc_persistent_hash(self) -> t.Iterable[t.ByteString]:
+        yield self._cube.persistent_hash().encode("ASCII")
+        yield self._nodes.persistent_hash().encode("ASCII")
+        for group, weight in sorted(self._groups.groups.items(), key=lambda pair: pair[0]):
+            yield group.encode("UTF-8")
+            yield str(weight).encode("ASCII")
+        for name in sorted(cardboard.name for cardboard in self._infinites):
+            yield name.encode("UTF-8")
+
     def __hash__(self) -> int:
         return hash((self._cube, self._nodes, self._groups, self._infinites))
 
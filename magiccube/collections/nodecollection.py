@@ -14,6 +14,12 @@ from mtgorp.models.serilization.serializeable import (
 from yeetlong.counters import FrozenCounter
 from yeetlong.multiset import FrozenMultiset
 
+from magiccube.collections.digest import (
+    DIGEST_MODULUS,
+    DigestHashable,
+    combine_digests,
+    element_digest,
+)
 from magiccube.laps.traps.tree.printingtree import PrintingNode
 
 
@@ -225,7 +231,7 @@ class ConstrainedNode(Serializeable, PersistentHashable):
         return self
 
 
-class NodeCollection(Serializeable):
+class NodeCollection(Serializeable, DigestHashable):
     def __init__(self, nodes: t.Iterable[ConstrainedNode]):
         self._nodes = nodes if isinstance(nodes, FrozenMultiset) else FrozenMultiset(nodes)
         self._nodes_map: t.Optional[t.Mapping[PrintingNode, ConstrainedNode]] = None
@@ -252,6 +258,33 @@ class NodeCollection(Serializeable):
     def items(self) -> t.Iterable[t.Tuple[ConstrainedNode, int]]:
         return self._nodes.items()
 
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        return ((element_digest(node.persistent_hash()), multiplicity) for node, multiplicity in self._nodes.items())
+
+    def _calc_persistent_hash(self) -> t.Iterable[t.ByteString]:
+        for persistent_hash, multiplicity in sorted(
+            ((node.persistent_hash(), multiplicity) for node, multiplicity in self._nodes.items()),
+            key=lambda pair: pair[0],
+        ):
+            yield persistent_hash.encode("ASCII")
+            yield str(multiplicity).encode("ASCII")
+
+    def _derive(self, nodes: FrozenMultiset[ConstrainedNode], changed: t.Iterable[ConstrainedNode]) -> NodeCollection:
+        derived = self.__class__(nodes)
+
+        if self._digest is not None:
+            previous_elements = self._nodes.elements()
+            elements = nodes.elements()
+            derived._digest = combine_digests(
+                (
+                    (element_digest(node.persistent_hash()), elements.get(node, 0) - previous_elements.get(node, 0))
+                    for node in changed
+                ),
+                self._digest,
+            )
+
+        return derived
+
     @property
     def all_printings(self) -> t.Iterator[Printing]:
         for node in self._nodes:
@@ -270,16 +303,16 @@ class NodeCollection(Serializeable):
         return isinstance(other, self.__class__) and self._nodes == other._nodes
 
     def __add__(self, other: t.Union[NodeCollection, NodesDeltaOperation]) -> NodeCollection:
-        return self.__class__(self._nodes + other.nodes)
+        return self._derive(self._nodes + other.nodes, (node for node, _ in other.nodes.items()))
 
     def __sub__(self, other: t.Union[NodeCollection, NodesDeltaOperation]) -> NodeCollection:
-        return self.__class__(self._nodes - other.nodes)
+        return self._derive(self._nodes - other.nodes, (node for node, _ in other.nodes.items()))
 
     def __repr__(self) -> str:
         return self._nodes.__repr__()
 
 
-class NodesDeltaOperation(Serializeable, PersistentHashable):
+class NodesDeltaOperation(Serializeable, DigestHashable):
     def __init__(
         self,
         nodes: t.Optional[t.Mapping[ConstrainedNode, int]] = None,
@@ -317,6 +350,14 @@ class NodesDeltaOperation(Serializeable, PersistentHashable):
             }
         )
 
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        return ((element_digest(node.persistent_hash()), multiplicity) for node, multiplicity in self._nodes.items())
+
+    def _with_digest(self, digest: t.Optional[int]) -> NodesDeltaOperation:
+        if digest is not None:
+            self._digest = digest % DIGEST_MODULUS
+        return self
+
     def _calc_persistent_hash(self) -> t.Iterable[t.ByteString]:
         for persistent_hash, multiplicity in sorted(
             ((node.persistent_hash(), multiplicity) for node, multiplicity in self._nodes.items()),
@@ -332,22 +373,26 @@ class NodesDeltaOperation(Serializeable, PersistentHashable):
         return isinstance(other, self.__class__) and self._nodes == other._nodes
 
     def __add__(self, other: t.Union[NodesDeltaOperation, NodeCollection]) -> NodesDeltaOperation:
-        return self.__class__(self._nodes + other.nodes)
+        return self.__class__(self._nodes + other.nodes)._with_digest(
+            None if self._digest is None or other._digest is None else self._digest + other._digest
+        )
 
     __radd__ = __add__
 
     def __sub__(self, other: t.Union[NodesDeltaOperation, NodeCollection]) -> NodesDeltaOperation:
-        return self.__class__(self._nodes - other.nodes)
+        return self.__class__(self._nodes - other.nodes)._with_digest(
+            None if self._digest is None or other._digest is None else self._digest - other._digest
+        )
 
     __rsub__ = __sub__
 
     def __mul__(self, other: int) -> NodesDeltaOperation:
-        return self.__class__(self._nodes * other)
+        return self.__class__(self._nodes * other)._with_digest(None if self._digest is None else self._digest * other)
 
     __rmul__ = __mul__
 
     def __invert__(self):
-        return self.__class__(self._nodes * -1)
+        return self.__class__(self._nodes * -1)._with_digest(None if self._digest is None else -self._digest)
 
     def __repr__(self) -> str:
         return "{}({})".format(
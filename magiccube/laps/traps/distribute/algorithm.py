@@ -3,17 +3,28 @@ from __future__ import annotations
 import itertools
 import math
 import random
+import time
 import typing as t
+import weakref
 from abc import abstractmethod
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
 
+import numpy as np
 from evolution import environment, logging, model
 from evolution.constraints import Constraint
-from evolution.environment import Environment, EvolutionModelBlueprint, I
+from evolution.environment import Environment, EvolutionModelBlueprint
 from mtgorp.models.interfaces import Printing
 
 from magiccube.collections.laps import TrapCollection
 from magiccube.collections.nodecollection import ConstrainedNode
+from magiccube.laps.traps.distribute.checkpoint import DistributorSnapshot
+from magiccube.laps.traps.distribute.instrumentation import (
+    GenerationTimings,
+    activate,
+    summarize_timings,
+    timed_score,
+)
 from magiccube.laps.traps.trap import IntentionType, Trap
 from magiccube.laps.traps.tree.printingtree import AllNode, PrintingNode
 
@@ -68,6 +79,79 @@ class DistributionNode(object):
         return self
 
 
+class DetachedDistributionNode(object):
+    """
+    The parts of a DistributionNode constraints look at, without the printing tree, so node tables can be shipped to
+    other processes cheaply.
+    """
+
+    def __init__(self, value: float, groups: t.FrozenSet[str], image_amount: int):
+        self.value = value
+        self.groups = groups
+        self.image_amount = image_amount
+
+    def __repr__(self):
+        return f"DDN({self.groups}, {self.value})"
+
+
+class DistributionNodeTable(object):
+    def __init__(self, nodes: t.Iterable[DistributionNode]):
+        self._nodes: t.List[DistributionNode] = list(nodes)
+        self._indexes: t.Dict[DistributionNode, int] = {node: index for index, node in enumerate(self._nodes)}
+
+        self._values = np.array([node.value for node in self._nodes], dtype=float)
+        self._image_amounts = np.array([node.image_amount for node in self._nodes], dtype=float)
+
+    @property
+    def nodes(self) -> t.List[DistributionNode]:
+        return self._nodes
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values
+
+    @property
+    def image_amounts(self) -> np.ndarray:
+        return self._image_amounts
+
+    def index(self, node: DistributionNode) -> int:
+        return self._indexes[node]
+
+    def assignment(self, traps: t.Sequence[t.Sequence[DistributionNode]]) -> np.ndarray:
+        assignment = np.full(len(self._nodes), -1, dtype=np.intp)
+        for trap_index, trap in enumerate(traps):
+            for node in trap:
+                assignment[self._indexes[node]] = trap_index
+        return assignment
+
+    @staticmethod
+    def trap_sums(
+        assignments: np.ndarray,
+        trap_amount: int,
+        weights: t.Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        population_size = assignments.shape[0]
+        return np.bincount(
+            (assignments + trap_amount * np.arange(population_size)[:, np.newaxis]).ravel(),
+            weights=None if weights is None else np.tile(weights, population_size),
+            minlength=population_size * trap_amount,
+        ).reshape(population_size, trap_amount)
+
+    def detached(self) -> DistributionNodeTable:
+        return DistributionNodeTable(
+            DetachedDistributionNode(node.value, node.groups, node.image_amount) for node in self._nodes
+        )
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memodict: t.Dict):
+        return self
+
+
 class TrapCollectionIndividual(model.Individual):
     class InvalidDistribution(Exception):
         pass
@@ -84,26 +168,33 @@ class TrapCollectionIndividual(model.Individual):
 T = t.TypeVar("T", bound=TrapCollectionIndividual)
 
 
-class TrapDistribution(TrapCollectionIndividual):
-    traps: t.List[t.List[DistributionNode]]
+NodeContribution = t.Callable[[DistributionNodeTable, int, np.ndarray], float]
+
 
+class TrapDistribution(TrapCollectionIndividual):
     def __init__(
         self,
         distribution_nodes: t.Iterable[DistributionNode] = (),
         trap_amount: int = 1,
         traps: t.Optional[t.List[t.List[DistributionNode]]] = None,
         random_initialization: bool = False,
+        node_table: t.Optional[DistributionNodeTable] = None,
+        origin: t.Optional[TrapDistribution] = None,
+        origin_indexes: t.Optional[t.Sequence[t.Optional[int]]] = None,
+        rng: t.Optional[random.Random] = None,
     ):
         super().__init__()
 
-        self._trap_amount = trap_amount
+        self._node_table = node_table
+        self._assignment: t.Optional[np.ndarray] = None
 
         if traps is None:
             self.traps = [[] for _ in range(trap_amount)]
 
             if random_initialization:
+                rng = random.Random() if rng is None else rng
                 for constrained_node in distribution_nodes:
-                    random.choice(self.traps).append(constrained_node)
+                    rng.choice(self.traps).append(constrained_node)
 
             else:
                 for constrained_node, trap in zip(distribution_nodes, itertools.cycle(self.traps)):
@@ -111,11 +202,156 @@ class TrapDistribution(TrapCollectionIndividual):
 
         else:
             self.traps = traps
-            self._trap_amount = len(self.traps)
+
+        if origin is not None:
+            self._origin = origin
+            self._origin_indexes = list(origin_indexes)
+
+    @classmethod
+    def from_assignment(
+        cls,
+        node_table: DistributionNodeTable,
+        trap_amount: int,
+        assignment: np.ndarray,
+    ) -> TrapDistribution:
+        traps = [[] for _ in range(trap_amount)]
+        for node, trap_index in zip(node_table.nodes, assignment.tolist()):
+            if trap_index >= 0:
+                traps[trap_index].append(node)
+
+        distribution = cls(traps=traps, node_table=node_table)
+        distribution._assignment = assignment.astype(np.intp)
+        return distribution
 
     @property
-    def trap_amount(self):
-        return self._trap_amount
+    def traps(self) -> t.List[t.List[DistributionNode]]:
+        return self._traps
+
+    @traps.setter
+    def traps(self, traps: t.List[t.List[DistributionNode]]) -> None:
+        self._traps = traps
+        self._assignment = None
+        self._trap_aggregates: t.Dict[t.Hashable, t.List[float]] = {}
+        self._aggregate_contributions: t.Dict[t.Hashable, NodeContribution] = {}
+        self._dirty_traps: t.Dict[t.Hashable, t.Set[int]] = {}
+        self._origin: t.Optional[TrapDistribution] = None
+        self._origin_indexes: t.List[t.Optional[int]] = []
+
+    @property
+    def trap_amount(self) -> int:
+        return len(self._traps)
+
+    @property
+    def node_table(self) -> DistributionNodeTable:
+        if self._node_table is None:
+            self._node_table = DistributionNodeTable(itertools.chain(*self._traps))
+        return self._node_table
+
+    @property
+    def assignment(self) -> np.ndarray:
+        if self._assignment is None:
+            self._assignment = self.node_table.assignment(self._traps)
+        return self._assignment
+
+    def invalidate(self) -> None:
+        self.traps = self._traps
+
+    def touch(self, *trap_indexes: int) -> None:
+        if self._assignment is not None:
+            for trap_index in trap_indexes:
+                for node in self._traps[trap_index]:
+                    self._assignment[self._node_table.index(node)] = trap_index
+
+        for dirty_traps in self._dirty_traps.values():
+            dirty_traps.update(trap_indexes)
+
+        if self._origin is not None:
+            for trap_index in trap_indexes:
+                self._origin_indexes[trap_index] = None
+
+    def move(self, from_index: int, position: int, to_index: int) -> DistributionNode:
+        """
+        Moves the node at position in one trap to the end of another. Cached aggregates with a node contribution are
+        updated for just the moved node, others are marked dirty for both traps.
+        """
+        node = self._traps[from_index].pop(position)
+        node_index = self.node_table.index(node)
+
+        for key, contribution in self._aggregate_contributions.items():
+            aggregates, dirty_traps = self._trap_aggregates[key], self._dirty_traps[key]
+            if from_index not in dirty_traps:
+                aggregates[from_index] -= contribution(
+                    self._node_table, node_index, self.trap_member_indexes(from_index)
+                )
+            if to_index not in dirty_traps:
+                aggregates[to_index] += contribution(self._node_table, node_index, self.trap_member_indexes(to_index))
+
+        self._traps[to_index].append(node)
+
+        if self._assignment is not None:
+            self._assignment[node_index] = to_index
+
+        for key, dirty_traps in self._dirty_traps.items():
+            if key not in self._aggregate_contributions:
+                dirty_traps.update((from_index, to_index))
+
+        if self._origin is not None:
+            self._origin_indexes[from_index] = None
+            self._origin_indexes[to_index] = None
+
+        return node
+
+    def update_traps(self, traps: t.List[t.List[DistributionNode]]) -> None:
+        if len(traps) != len(self._traps):
+            self.traps = traps
+            return
+
+        changed = [index for index, (old, new) in enumerate(zip(self._traps, traps)) if set(old) != set(new)]
+        self._traps = traps
+        self.touch(*changed)
+
+    def trap_member_indexes(self, trap_index: int) -> np.ndarray:
+        return np.array(sorted(self.node_table.index(node) for node in self._traps[trap_index]), dtype=np.intp)
+
+    def trap_aggregates(
+        self,
+        key: t.Hashable,
+        aggregate: t.Callable[[DistributionNodeTable, np.ndarray], float],
+        contribution: t.Optional[NodeContribution] = None,
+    ) -> t.List[float]:
+        """
+        The aggregate of each trap's member indexes, cached under key. Traps marked dirty are recomputed. If
+        contribution is given, moves update the cached aggregates by the moved node's contribution instead.
+        """
+        aggregates = self._trap_aggregates.get(key)
+
+        if aggregates is None:
+            if self._origin is not None and self._origin.node_table is self.node_table:
+                origin_aggregates = self._origin.trap_aggregates(key, aggregate)
+                aggregates = [
+                    (
+                        aggregate(self.node_table, self.trap_member_indexes(index))
+                        if origin_index is None
+                        else origin_aggregates[origin_index]
+                    )
+                    for index, origin_index in enumerate(self._origin_indexes)
+                ]
+            else:
+                aggregates = [
+                    aggregate(self.node_table, self.trap_member_indexes(index)) for index in range(len(self._traps))
+                ]
+            self._trap_aggregates[key] = aggregates
+            self._dirty_traps[key] = set()
+            if contribution is not None:
+                self._aggregate_contributions[key] = contribution
+
+        else:
+            dirty_traps = self._dirty_traps[key]
+            for index in dirty_traps:
+                aggregates[index] = aggregate(self.node_table, self.trap_member_indexes(index))
+            dirty_traps.clear()
+
+        return aggregates
 
     def as_trap_collection(
         self,
@@ -157,6 +393,62 @@ def logistic(x: float, max_value: float, mid: float, slope: float) -> float:
         return 0
 
 
+N = t.TypeVar("N")
+
+
+def match_trap_collection(
+    traps: TrapCollection,
+    candidates: t.Mapping[PrintingNode, t.List[N]],
+) -> t.Tuple[t.List[t.List[N]], t.List[t.Tuple[PrintingNode, int]]]:
+    """
+    Places a candidate for each child of each trap, popping them from candidates, and returns the placed candidates per
+    trap along with the children no candidate was left for.
+    """
+    distribution: t.List[t.List[N]] = [[] for _ in range(len(traps))]
+    removed: t.List[t.Tuple[PrintingNode, int]] = []
+
+    for index, trap in enumerate(traps):
+        for child in trap.node.children:
+            printing_node = child if isinstance(child, PrintingNode) else AllNode((child,))
+
+            try:
+                distribution[index].append(candidates[printing_node].pop())
+            except (KeyError, IndexError):
+                removed.append((printing_node, index))
+
+    return distribution, removed
+
+
+def trap_value(node_table: DistributionNodeTable, member_indexes: np.ndarray) -> float:
+    return float(node_table.values[member_indexes].sum())
+
+
+def trap_size(node_table: DistributionNodeTable, member_indexes: np.ndarray) -> float:
+    return float(len(member_indexes))
+
+
+def trap_image_amount(node_table: DistributionNodeTable, member_indexes: np.ndarray) -> float:
+    return float(node_table.image_amounts[member_indexes].sum())
+
+
+def logistic_array(x: np.ndarray, max_value: float, mid: float, slope: float) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return max_value / (1 + np.exp(slope * (x - mid)))
+
+
+def population_assignments(
+    distributions: t.Sequence[TrapDistribution],
+) -> t.Tuple[DistributionNodeTable, int, np.ndarray]:
+    node_table = distributions[0].node_table
+    trap_amount = distributions[0].trap_amount
+
+    for distribution in distributions:
+        if distribution.node_table is not node_table or distribution.trap_amount != trap_amount:
+            raise ValueError("Distributions must share node table and trap amount")
+
+    return node_table, trap_amount, np.stack([distribution.assignment for distribution in distributions])
+
+
 class ValueDistributionHomogeneityConstraint(Constraint):
     description = "Value distribution homogeneity"
 
@@ -168,12 +460,24 @@ class ValueDistributionHomogeneityConstraint(Constraint):
         self._average_trap_value = sum((node.value for node in nodes)) / trap_amount
         self._relator = self._average_trap_value**2 * trap_amount
 
-    def _value_distribution_heterogeneity_factor(self, distribution: TrapDistribution) -> float:
-        return sum(((sum(node.value for node in trap) - self._average_trap_value) ** 2 for trap in distribution.traps))
+    @timed_score
+    def score_population(self, distributions: t.Sequence[TrapDistribution]) -> np.ndarray:
+        node_table, trap_amount, assignments = population_assignments(distributions)
+        trap_values = node_table.trap_sums(assignments, trap_amount, node_table.values)
+        return logistic_array(
+            x=((trap_values - self._average_trap_value) ** 2).sum(axis=1) / self._relator,
+            max_value=2,
+            mid=0,
+            slope=7,
+        )
 
+    @timed_score
     def score(self, distribution: TrapDistribution) -> float:
         return logistic(
-            x=self._value_distribution_heterogeneity_factor(distribution) / self._relator,
+            x=float(
+                ((np.array(distribution.trap_aggregates("value", trap_value)) - self._average_trap_value) ** 2).sum()
+            )
+            / self._relator,
             max_value=2,
             mid=0,
             slope=7,
@@ -183,6 +487,9 @@ class ValueDistributionHomogeneityConstraint(Constraint):
 class GroupExclusivityConstraint(Constraint):
     description = "Group exclusivity"
 
+    # Keys of the aggregates cached on distributions. Unlike ids, they are never reused by a later instance.
+    _aggregate_keys = itertools.count()
+
     def __init__(
         self,
         nodes: t.Iterable[DistributionNode],
@@ -190,39 +497,83 @@ class GroupExclusivityConstraint(Constraint):
         group_weights: t.Mapping[str, float],
     ):
         self._group_weights = {} if group_weights is None else group_weights
+        self._collision_matrices: t.MutableMapping[DistributionNodeTable, np.ndarray] = weakref.WeakKeyDictionary()
+        self._aggregate_key = ("collision", next(self._aggregate_keys))
 
-        self._relator = (self._get_nodes_collision_factor(nodes) / trap_amount) ** 2
+        node_table = DistributionNodeTable(nodes)
+        self._relator = (self.collision_matrix(node_table).sum() / 2 / trap_amount) ** 2
 
-    def _get_nodes_collision_factor(self, nodes: t.Iterable[DistributionNode]) -> float:
-        groups: t.Dict[str, t.List[DistributionNode]] = {}
-        collisions: t.Dict[t.FrozenSet[DistributionNode], t.List[str]] = {}
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_collision_matrices"]
+        del state["_aggregate_key"]
+        return state
 
-        for constrained_node in nodes:
-            for group in constrained_node.groups:
-                if group in groups:
-                    for other_node in groups[group]:
-                        _collision_key = frozenset((constrained_node, other_node))
-                        try:
-                            collisions[_collision_key].append(group)
-                        except KeyError:
-                            collisions[_collision_key] = [group]
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._collision_matrices = weakref.WeakKeyDictionary()
+        self._aggregate_key = ("collision", next(self._aggregate_keys))
 
-                    groups[group].append(constrained_node)
+    def _calculate_collision_matrix(self, node_table: DistributionNodeTable) -> np.ndarray:
+        group_members: t.Dict[str, t.List[int]] = defaultdict(list)
 
-                else:
-                    groups[group] = [constrained_node]
+        for index, node in enumerate(node_table.nodes):
+            for group in node.groups:
+                group_members[group].append(index)
 
-        return sum(
-            (
-                (1 - 1 / (1 + sum(node.value for node in nodes)))
-                * max(self._group_weights.get(group, 0.1) for group in groups)
+        group_weights = np.full((len(node_table), len(node_table)), -np.inf)
+
+        for group, members in group_members.items():
+            if len(members) > 1:
+                block = np.ix_(members, members)
+                group_weights[block] = np.maximum(group_weights[block], self._group_weights.get(group, 0.1))
+
+        np.fill_diagonal(group_weights, -np.inf)
+
+        values = node_table.values
+        with np.errstate(invalid="ignore"):
+            return np.where(
+                np.isfinite(group_weights),
+                (1 - 1 / (1 + values[:, np.newaxis] + values[np.newaxis, :])) * group_weights,
+                0.0,
             )
-            for nodes, groups in collisions.items()
-        )
 
-    def group_collision_factor(self, distribution: TrapDistribution) -> int:
-        return sum(self._get_nodes_collision_factor(trap) ** 2 for trap in distribution.traps)
+    def collision_matrix(self, node_table: DistributionNodeTable) -> np.ndarray:
+        try:
+            return self._collision_matrices[node_table]
+        except KeyError:
+            matrix = self._collision_matrices[node_table] = self._calculate_collision_matrix(node_table)
+            return matrix
 
+    def trap_collision_factor(self, node_table: DistributionNodeTable, node_indexes: t.Sequence[int]) -> float:
+        return float(self.collision_matrix(node_table)[np.ix_(node_indexes, node_indexes)].sum() / 2)
+
+    def _trap_collision_aggregate(self, node_table: DistributionNodeTable, member_indexes: np.ndarray) -> float:
+        return self.trap_collision_factor(node_table, member_indexes)
+
+    def _node_collision_contribution(
+        self,
+        node_table: DistributionNodeTable,
+        node_index: int,
+        member_indexes: np.ndarray,
+    ) -> float:
+        return float(self.collision_matrix(node_table)[node_index, member_indexes].sum())
+
+    def group_collision_factor(self, distribution: TrapDistribution) -> float:
+        return float(
+            (
+                np.array(
+                    distribution.trap_aggregates(
+                        self._aggregate_key,
+                        self._trap_collision_aggregate,
+                        self._node_collision_contribution,
+                    )
+                )
+                ** 2
+            ).sum()
+        )
+
+    @timed_score
     def score(self, distribution: TrapDistribution) -> float:
         return logistic(
             x=self.group_collision_factor(distribution) / self._relator,
@@ -243,12 +594,22 @@ class SizeHomogeneityConstraint(Constraint):
         self._average_trap_size = len(nodes) / trap_amount
         self._relator = self._average_trap_size**2 * trap_amount
 
-    def _size_heterogeneity_factor(self, distribution: TrapDistribution) -> float:
-        return sum((len(trap) - self._average_trap_size) ** 2 for trap in distribution.traps)
+    @timed_score
+    def score_population(self, distributions: t.Sequence[TrapDistribution]) -> np.ndarray:
+        node_table, trap_amount, assignments = population_assignments(distributions)
+        trap_sizes = node_table.trap_sums(assignments, trap_amount)
+        return logistic_array(
+            x=((trap_sizes - self._average_trap_size) ** 2).sum(axis=1) / self._relator,
+            max_value=2,
+            mid=0,
+            slope=5,
+        )
 
+    @timed_score
     def score(self, distribution: TrapDistribution) -> float:
         return logistic(
-            x=self._size_heterogeneity_factor(distribution) / self._relator,
+            x=float(((np.array(distribution.trap_aggregates("size", trap_size)) - self._average_trap_size) ** 2).sum())
+            / self._relator,
             max_value=2,
             mid=0,
             slope=5,
@@ -266,43 +627,154 @@ class ImageAmountHomogeneity(Constraint):
         self._average_trap_image_amount = sum(node.image_amount for node in nodes) / trap_amount
         self._relator = self._average_trap_image_amount**2 * trap_amount
 
-    def _image_amount_heterogeneity_factor(self, distribution: TrapDistribution) -> float:
-        return sum(
-            (sum(node.image_amount for node in trap) - self._average_trap_image_amount) ** 2
-            for trap in distribution.traps
+    @timed_score
+    def score_population(self, distributions: t.Sequence[TrapDistribution]) -> np.ndarray:
+        node_table, trap_amount, assignments = population_assignments(distributions)
+        trap_image_amounts = node_table.trap_sums(assignments, trap_amount, node_table.image_amounts)
+        return logistic_array(
+            x=((trap_image_amounts - self._average_trap_image_amount) ** 2).sum(axis=1) / self._relator,
+            max_value=2,
+            mid=0,
+            slope=5,
         )
 
+    @timed_score
     def score(self, distribution: TrapDistribution) -> float:
         return logistic(
-            x=self._image_amount_heterogeneity_factor(distribution) / self._relator,
+            x=float(
+                (
+                    (
+                        np.array(distribution.trap_aggregates("image_amount", trap_image_amount))
+                        - self._average_trap_image_amount
+                    )
+                    ** 2
+                ).sum()
+            )
+            / self._relator,
             max_value=2,
             mid=0,
             slope=5,
         )
 
 
+class PopulationConstraintSet(object):
+    """
+    Weighted constraints that score one distribution, like a ConstraintSet, or a whole population at once. Each score
+    is the constraint's score times its weight. Constraints with a score_population method score each group of
+    distributions sharing node table and trap amount from stacked assignment arrays, the rest score one distribution
+    at a time.
+    """
+
+    def __init__(self, constraints: t.Iterable[t.Tuple[Constraint, float]]):
+        self._constraints: t.Tuple[t.Tuple[Constraint, float], ...] = tuple(constraints)
+
+    def __iter__(self) -> t.Iterator[t.Tuple[Constraint, float]]:
+        return iter(self._constraints)
+
+    def __call__(self, distribution: TrapDistribution) -> t.Tuple[float, ...]:
+        return tuple(constraint.score(distribution) * weight for constraint, weight in self._constraints)
+
+    def score_population(self, distributions: t.Sequence[TrapDistribution]) -> t.List[t.Tuple[float, ...]]:
+        groups: t.Dict[t.Tuple[int, int], t.List[int]] = defaultdict(list)
+        for index, distribution in enumerate(distributions):
+            groups[(id(distribution.node_table), distribution.trap_amount)].append(index)
+
+        scores = np.empty((len(distributions), len(self._constraints)))
+        for indexes in groups.values():
+            group = [distributions[index] for index in indexes]
+            for column, (constraint, weight) in enumerate(self._constraints):
+                if hasattr(constraint, "score_population"):
+                    scores[indexes, column] = constraint.score_population(group) * weight
+                else:
+                    scores[indexes, column] = [constraint.score(distribution) * weight for distribution in group]
+
+        return [tuple(row) for row in scores.tolist()]
+
+
+_evaluation_node_table: t.Optional[DistributionNodeTable] = None
+_evaluation_constraints: t.Optional[t.Callable[[TrapDistribution], t.Tuple[float, ...]]] = None
+
+
+def _initialize_evaluation_worker(
+    node_table: DistributionNodeTable,
+    constraints: t.Callable[[TrapDistribution], t.Tuple[float, ...]],
+) -> None:
+    global _evaluation_node_table, _evaluation_constraints
+    _evaluation_node_table = node_table
+    _evaluation_constraints = constraints
+
+
+def _evaluate_assignment(trap_amount: int, assignment: np.ndarray) -> t.Tuple[float, ...]:
+    return _evaluation_constraints(TrapDistribution.from_assignment(_evaluation_node_table, trap_amount, assignment))
+
+
 class BaseDistributor(Environment[T]):
+    """
+    If evaluation_workers is set, fitness is evaluated in a pool of that many processes. Each worker receives the node
+    table and constraints once, and individuals are sent as assignment arrays as soon as they are created, mutated or
+    mated, so the pool works through a generation while the rest of it is still being bred. Fitness only depends on
+    the assignment, so results are the same as when evaluating serially.
+
+    Otherwise, if constraints is a PopulationConstraintSet, individuals created, mutated or mated during a generation
+    are collected, and the first fitness evaluation of any of them scores all of them in one score_population call.
+
+    If instrument is set, each generation records the time spent creating, mutating, mating and evaluating
+    individuals, the time each constraint spends scoring, and attributes the rest to selection.
+    """
+
     def __init__(
         self,
         distribution_nodes: t.Iterable[DistributionNode],
         trap_amount: int,
-        constraints: t.Callable[[I], t.Tuple[float, ...]],
+        constraints: t.Callable[[TrapDistribution], t.Tuple[float, ...]],
         model_blue_print: t.Optional[EvolutionModelBlueprint] = None,
         logger: t.Optional[logging.Logger] = None,
+        *,
+        evaluation_workers: int = 0,
+        rng: t.Optional[random.Random] = None,
+        instrument: bool = False,
         **kwargs,
     ):
         self._model_blue_print = model_blue_print or EvolutionModelBlueprint(
             environment.SimpleModel, initial_population_size=300
         )
         self._distribution_nodes: t.List[DistributionNode] = list(distribution_nodes)
+        self._node_table = DistributionNodeTable(self._distribution_nodes)
         self._trap_amount = trap_amount
+        self._constraints = constraints
+        self._random = random.Random() if rng is None else rng
+
+        self._evaluation_workers = evaluation_workers
+        self._evaluation_pool: t.Optional[ProcessPoolExecutor] = None
+        self._pending_evaluations: t.Dict[int, t.Tuple[T, Future]] = {}
+        self._batch_evaluation = not evaluation_workers and isinstance(constraints, PopulationConstraintSet)
+        self._unscored: t.Dict[int, T] = {}
+        self._batch_scores: t.Dict[int, t.Tuple[T, t.Tuple[float, ...]]] = {}
+
+        self._instrument = instrument
+        self._timings = GenerationTimings()
+        self._timings_history: t.List[GenerationTimings] = []
 
         super().__init__(
             self._model_blue_print.realise(
-                individual_factory=self.create_individual,
-                fitness_evaluator=constraints,
-                mutate=lambda i, d: self.mutate(i),
-                mate=lambda f, s, d: self.mate(f, s),
+                individual_factory=self._instrumented(
+                    "create",
+                    lambda: self._submit_evaluation(self.create_individual()),
+                ),
+                fitness_evaluator=self._instrumented("evaluate", self._evaluate),
+                mutate=self._instrumented(
+                    "mutate",
+                    lambda i, d: self._submit_evaluation(self.mutate(self._discard_evaluation(i))),
+                ),
+                mate=self._instrumented(
+                    "mate",
+                    lambda f, s, d: tuple(
+                        map(
+                            self._submit_evaluation,
+                            self.mate(self._discard_evaluation(f), self._discard_evaluation(s)),
+                        )
+                    ),
+                ),
             ),
             logger=logger
             or logging.Logger(
@@ -334,14 +806,203 @@ class BaseDistributor(Environment[T]):
     def create_individual(self) -> T:
         pass
 
+    def evaluated_distribution(self, individual: T) -> TrapDistribution:
+        return individual
+
+    @property
+    def evaluation_node_table(self) -> DistributionNodeTable:
+        return self._node_table
+
+    def _evaluate(self, individual: T) -> t.Tuple[float, ...]:
+        if id(individual) in self._unscored:
+            self._score_unscored()
+
+        try:
+            _, scores = self._batch_scores.pop(id(individual))
+        except KeyError:
+            pass
+        else:
+            return scores
+
+        try:
+            _, future = self._pending_evaluations.pop(id(individual))
+        except KeyError:
+            return self._constraints(self.evaluated_distribution(individual))
+        return future.result()
+
+    def _score_unscored(self) -> None:
+        individuals = list(self._unscored.values())
+        self._unscored.clear()
+        for individual, scores in zip(
+            individuals,
+            self._constraints.score_population(
+                [self.evaluated_distribution(individual) for individual in individuals]
+            ),
+        ):
+            self._batch_scores[id(individual)] = (individual, scores)
+
+    def _submit_evaluation(self, individual: T) -> T:
+        if self._batch_evaluation:
+            self._unscored[id(individual)] = individual
+            return individual
+
+        if not self._evaluation_workers:
+            return individual
+
+        if self._evaluation_pool is None:
+            self._evaluation_pool = ProcessPoolExecutor(
+                max_workers=self._evaluation_workers,
+                initializer=_initialize_evaluation_worker,
+                initargs=(self.evaluation_node_table.detached(), self._constraints),
+            )
+
+        distribution = self.evaluated_distribution(individual)
+        self._pending_evaluations[id(individual)] = (
+            individual,
+            self._evaluation_pool.submit(
+                _evaluate_assignment,
+                distribution.trap_amount,
+                distribution.assignment.astype(np.min_scalar_type(-distribution.trap_amount)),
+            ),
+        )
+        return individual
+
+    def _discard_evaluation(self, individual: T) -> T:
+        self._unscored.pop(id(individual), None)
+        self._batch_scores.pop(id(individual), None)
+        pending = self._pending_evaluations.pop(id(individual), None)
+        if pending is not None:
+            pending[1].cancel()
+        return individual
+
+    def _instrumented(self, phase: str, f: t.Callable) -> t.Callable:
+        if not self._instrument:
+            return f
+
+        def _timed(*args):
+            start = time.perf_counter()
+            try:
+                return f(*args)
+            finally:
+                self._timings.add(phase, time.perf_counter() - start)
+
+        return _timed
+
+    @property
+    def instrumented(self) -> bool:
+        return self._instrument
+
+    @property
+    def last_timings(self) -> t.Optional[GenerationTimings]:
+        return self._timings_history[-1] if self._timings_history else None
+
+    @property
+    def timings_history(self) -> t.List[GenerationTimings]:
+        return self._timings_history
+
+    def record_timing(self, phase: str, seconds: float) -> None:
+        """
+        Records time spent on the distributor's behalf between generations, such as reporting the last one, in the
+        timings of the generation being spawned next.
+        """
+        if self._instrument:
+            self._timings.add_external(phase, seconds)
+
+    def timing_summary(self) -> t.Dict[str, t.Any]:
+        return summarize_timings(self._timings_history)
+
+    def _spawn_generation(self):
+        try:
+            return super().spawn_generation()
+        finally:
+            for _, future in self._pending_evaluations.values():
+                future.cancel()
+            self._pending_evaluations.clear()
+            self._unscored.clear()
+            self._batch_scores.clear()
+
+    def spawn_generation(self):
+        if not self._instrument:
+            return self._spawn_generation()
+
+        activate(self._timings)
+        start = time.perf_counter()
+        try:
+            return self._spawn_generation()
+        finally:
+            self._timings.finish(time.perf_counter() - start)
+            activate(None)
+            self._timings_history.append(self._timings)
+            self._timings = GenerationTimings()
+
+    def close(self) -> None:
+        if self._evaluation_pool is not None:
+            self._evaluation_pool.shutdown(cancel_futures=True)
+            self._evaluation_pool = None
+        self._pending_evaluations.clear()
+        self._unscored.clear()
+        self._batch_scores.clear()
+
+    @property
+    def population(self) -> t.List[T]:
+        return self._model.population
+
+    @staticmethod
+    def fitness(individual: T) -> float:
+        return individual.weighted_fitness
+
+    def fittest(self, amount: int = 1) -> t.List[T]:
+        return sorted(self.population, key=self.fitness, reverse=True)[:amount]
+
+    def evaluate(self, individual: T) -> T:
+        """
+        Evaluates the fitness of an individual entering the population without being bred by it, such as an immigrant
+        or a restored individual, the same way the environment does for its offspring.
+        """
+        individual.fitness = self._evaluate(individual)
+        return individual
+
+    def replace_weakest(self, individuals: t.Sequence[T]) -> None:
+        population = self.population
+        population.sort(key=self.fitness)
+        population[: len(individuals)] = individuals
+
+    @abstractmethod
+    def encode_population(self, population: t.Sequence[T]) -> t.Any:
+        pass
+
+    @abstractmethod
+    def decode_population(self, encoded: t.Any) -> t.List[T]:
+        pass
+
+    def snapshot(self) -> DistributorSnapshot:
+        return DistributorSnapshot(
+            population=self.encode_population(self.population),
+            logger_values=[tuple(values) for values in self._logger.values],
+            random_state=self._random.getstate(),
+        )
+
+    def restore(self, snapshot: DistributorSnapshot) -> None:
+        self.population[:] = [self.evaluate(individual) for individual in self.decode_population(snapshot.population)]
+        self._logger.values[:] = snapshot.logger_values
+        self._random.setstate(snapshot.random_state)
+
     @property
     def distribution_nodes(self) -> t.List[DistributionNode]:
         return self._distribution_nodes
 
+    @property
+    def node_table(self) -> DistributionNodeTable:
+        return self._node_table
+
     @property
     def trap_amount(self):
         return self._trap_amount
 
+    @property
+    def rng(self) -> random.Random:
+        return self._random
+
     def show_plot(self) -> None:
         import matplotlib.pyplot as plt
 
@@ -361,50 +1022,131 @@ class BaseDistributor(Environment[T]):
         plt.show()
 
 
-class Distributor(BaseDistributor[TrapDistribution]):
+class AssignmentDistributor(BaseDistributor[T]):
+    """
+    Distributor of individuals fully described by their trap amount and assignment array, which is how they are
+    encoded for checkpoints and moved between islands.
+    """
+
+    @abstractmethod
+    def individual_from_assignment(self, trap_amount: int, assignment: np.ndarray) -> T:
+        pass
+
+    def encode_population(self, population: t.Sequence[T]) -> t.Any:
+        trap_amounts = np.array([individual.trap_amount for individual in population], dtype=np.intp)
+        return (
+            trap_amounts,
+            np.stack([individual.assignment for individual in population]).astype(
+                np.min_scalar_type(-int(trap_amounts.max(initial=1)))
+            ),
+        )
+
+    def decode_population(self, encoded: t.Any) -> t.List[T]:
+        trap_amounts, assignments = encoded
+        return [
+            self.individual_from_assignment(int(trap_amount), assignment)
+            for trap_amount, assignment in zip(trap_amounts, assignments)
+        ]
+
+
+class Distributor(AssignmentDistributor[TrapDistribution]):
+    """
+    If warm_start is given, about warm_start_fraction of created individuals start from that trap collection, with
+    nodes it does not place spread randomly, and up to warm_start_mutations mutations applied.
+    """
+
+    def __init__(
+        self,
+        distribution_nodes: t.Iterable[DistributionNode],
+        trap_amount: int,
+        constraints: t.Callable[[TrapDistribution], t.Tuple[float, ...]],
+        model_blue_print: t.Optional[EvolutionModelBlueprint] = None,
+        logger: t.Optional[logging.Logger] = None,
+        *,
+        warm_start: t.Optional[TrapCollection] = None,
+        warm_start_fraction: float = 0.25,
+        warm_start_mutations: int = 3,
+        **kwargs,
+    ):
+        self._warm_start = warm_start
+        self._warm_start_fraction = warm_start_fraction
+        self._warm_start_mutations = warm_start_mutations
+        self._warm_start_traps: t.Optional[t.List[t.List[DistributionNode]]] = None
+
+        super().__init__(distribution_nodes, trap_amount, constraints, model_blue_print, logger, **kwargs)
+
+    def _get_warm_start_traps(self) -> t.List[t.List[DistributionNode]]:
+        if self._warm_start_traps is None:
+            candidates: t.Dict[PrintingNode, t.List[DistributionNode]] = defaultdict(list)
+            for node in self._distribution_nodes:
+                candidates[node.node].append(node)
+
+            placed, _ = match_trap_collection(self._warm_start, candidates)
+
+            traps = placed[: self._trap_amount] + [[] for _ in range(self._trap_amount - len(placed))]
+            for node in itertools.chain(*placed[self._trap_amount :], *candidates.values()):
+                self._random.choice(traps).append(node)
+
+            self._warm_start_traps = traps
+
+        return self._warm_start_traps
+
     def create_individual(self) -> TrapCollectionIndividual:
+        if self._warm_start is not None and self._random.random() < self._warm_start_fraction:
+            distribution = TrapDistribution(
+                traps=[list(trap) for trap in self._get_warm_start_traps()],
+                node_table=self._node_table,
+            )
+            for _ in range(self._random.randint(0, self._warm_start_mutations)):
+                self.mutate(distribution)
+            return distribution
+
         return TrapDistribution(
             distribution_nodes=self._distribution_nodes,
             trap_amount=self._trap_amount,
             random_initialization=True,
+            node_table=self._node_table,
+            rng=self._random,
         )
 
+    def individual_from_assignment(self, trap_amount: int, assignment: np.ndarray) -> TrapDistribution:
+        return TrapDistribution.from_assignment(self._node_table, trap_amount, assignment)
+
     def mutate(self, distribution: TrapDistribution) -> TrapDistribution:
-        if random.random() > 0.3:
-            for i in range(random.randint(1, 5)):
-                selected_group = random.choice([group for group in distribution.traps if group])
-                target_group = random.choice([group for group in distribution.traps if group != selected_group])
-                target_group.append(
-                    selected_group.pop(
-                        random.randint(
-                            0,
-                            len(selected_group) - 1,
-                        )
-                    )
+        traps = distribution.traps
+
+        if self._random.random() > 0.3:
+            for i in range(self._random.randint(1, 5)):
+                selected_index = self._random.choice([index for index, group in enumerate(traps) if group])
+                target_index = self._random.choice([index for index in range(len(traps)) if index != selected_index])
+                distribution.move(
+                    selected_index,
+                    self._random.randint(
+                        0,
+                        len(traps[selected_index]) - 1,
+                    ),
+                    target_index,
                 )
         else:
-            for i in range(random.randint(1, 2)):
-                first_group = random.choice([group for group in distribution.traps if group])
-                possible_second_groups = [group for group in distribution.traps if group != first_group and group]
-                if not possible_second_groups:
+            for i in range(self._random.randint(1, 2)):
+                first_index = self._random.choice([index for index, group in enumerate(traps) if group])
+                possible_second_indexes = [
+                    index for index, group in enumerate(traps) if index != first_index and group
+                ]
+                if not possible_second_indexes:
                     continue
-                second_group = random.choice(possible_second_groups)
-
-                first = first_group.pop(
-                    random.randint(
-                        0,
-                        len(first_group) - 1,
-                    )
+                second_index = self._random.choice(possible_second_indexes)
+                first_position = self._random.randint(
+                    0,
+                    len(traps[first_index]) - 1,
                 )
-                second = second_group.pop(
-                    random.randint(
-                        0,
-                        len(second_group) - 1,
-                    )
+                second_position = self._random.randint(
+                    0,
+                    len(traps[second_index]) - 1,
                 )
 
-                first_group.append(second)
-                second_group.append(first)
+                distribution.move(first_index, first_position, second_index)
+                distribution.move(second_index, second_position, first_index)
 
         return distribution
 
@@ -424,8 +1166,8 @@ class Distributor(BaseDistributor[TrapDistribution]):
             traps = [[] for _ in range(self.trap_amount)]
 
             for node, possibilities in locations.items():
-                traps[random.choice(possibilities)].append(node)
+                traps[self._random.choice(possibilities)].append(node)
 
-            distribution.traps = traps
+            distribution.update_traps(traps)
 
         return first, second
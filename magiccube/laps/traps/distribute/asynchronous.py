@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import typing as t
+
+from magiccube.laps.traps.distribute.distribute import DistributionWorker
+
+
+class AsyncDistributionWorker(object):
+    """
+    Drives a DistributionWorker from an asyncio event loop. The distributor keeps running on the worker's own thread
+    (and, for IslandDistributionWorker, its island processes), while the worker wakes the loop whenever it puts a
+    message on its queue, so neither iterating messages nor awaiting status changes polls.
+
+    Messages are the worker's own, frames and status changes alike, with its frame coalescing and dropping applied.
+    Iteration ends after the "stopped" status. Only one consumer should iterate a worker.
+    """
+
+    def __init__(
+        self,
+        worker: DistributionWorker,
+        *,
+        loop: t.Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self._worker = worker
+        self._loop = asyncio.get_event_loop() if loop is None else loop
+        self._available = asyncio.Event()
+        self._status: t.Optional[str] = None
+        self._status_waiters: t.List[t.Tuple[t.FrozenSet[str], asyncio.Future]] = []
+
+        self._worker.message_queue.add_listener(self._notify)
+
+    @property
+    def worker(self) -> DistributionWorker:
+        return self._worker
+
+    @property
+    def status(self) -> t.Optional[str]:
+        return self._status
+
+    def _notify(self, message: t.Dict[str, t.Any]) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._on_message, message)
+        except RuntimeError:
+            # The loop has been closed, there is no one left to notify.
+            pass
+
+    def _on_message(self, message: t.Dict[str, t.Any]) -> None:
+        self._available.set()
+
+        if message["type"] != "status":
+            return
+
+        self._status = message["status"]
+        waiters = []
+        for statuses, future in self._status_waiters:
+            if self._status in statuses:
+                if not future.done():
+                    future.set_result(self._status)
+            else:
+                waiters.append((statuses, future))
+        self._status_waiters = waiters
+
+    def _wait_for_status(self, *statuses: str) -> asyncio.Future:
+        future = self._loop.create_future()
+        self._status_waiters.append((frozenset(statuses), future))
+        return future
+
+    async def _transition(self, transition: t.Callable[[], bool], *statuses: str) -> bool:
+        waiter = self._wait_for_status(*statuses)
+        if not transition():
+            waiter.cancel()
+            return False
+        await waiter
+        return True
+
+    def start(self) -> None:
+        self._worker.start()
+
+    async def pause(self) -> bool:
+        """
+        Pause the worker, returning once it has paused. Returns False if it was not running.
+        """
+        return await self._transition(self._worker.pause, "paused", "stopped")
+
+    async def resume(self) -> bool:
+        """
+        Resume the worker, returning once it is running again. Returns False if it was not paused.
+        """
+        return await self._transition(self._worker.resume, "running", "stopped")
+
+    async def stop(self) -> None:
+        """
+        Stop the worker, returning once its thread has finished.
+        """
+        self._worker.stop()
+        if self._worker.is_alive():
+            await self._loop.run_in_executor(None, self._worker.join)
+
+    async def messages(self) -> t.AsyncIterator[t.Dict[str, t.Any]]:
+        while True:
+            self._available.clear()
+            try:
+                message = self._worker.message_queue.get_nowait()
+            except queue.Empty:
+                await self._available.wait()
+                continue
+
+            yield message
+
+            if message["type"] == "status" and message["status"] == "stopped":
+                return
+
+    def __aiter__(self) -> t.AsyncIterator[t.Dict[str, t.Any]]:
+        return self.messages()
+
+    async def __aenter__(self) -> AsyncDistributionWorker:
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.stop()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import gzip
+import os
+import pickle
+import threading
+import typing as t
+
+
+CHECKPOINT_VERSION = 1
+
+
+class DistributorSnapshot(object):
+    """
+    State needed to resume a distributor: its population in the distributor's own compact encoding, the logged
+    generation values and the state of its random generator.
+    """
+
+    def __init__(
+        self,
+        population: t.Any,
+        logger_values: t.List[t.Tuple[float, ...]],
+        random_state: t.Any,
+    ):
+        self.population = population
+        self.logger_values = logger_values
+        self.random_state = random_state
+
+
+def write_checkpoint(path: str, snapshot: DistributorSnapshot) -> None:
+    temporary_path = path + ".tmp"
+    with gzip.open(temporary_path, "wb") as f:
+        pickle.dump(
+            (
+                CHECKPOINT_VERSION,
+                snapshot.population,
+                snapshot.logger_values,
+                snapshot.random_state,
+            ),
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(temporary_path, path)
+
+
+def read_checkpoint(path: str) -> DistributorSnapshot:
+    with gzip.open(path, "rb") as f:
+        version, population, logger_values, random_state = pickle.load(f)
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {version}")
+    return DistributorSnapshot(population, logger_values, random_state)
+
+
+class CheckpointWriter(threading.Thread):
+    """
+    Writes snapshots to path on its own thread. Only the latest submitted snapshot is kept, so a slow disk drops
+    intermediate checkpoints rather than holding up the generation loop.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self._path = path
+        self._pending: t.Optional[DistributorSnapshot] = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def submit(self, snapshot: DistributorSnapshot) -> None:
+        with self._condition:
+            self._pending = snapshot
+            self._condition.notify()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self.is_alive():
+            self.join()
+
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+
+            write_checkpoint(self._path, snapshot)
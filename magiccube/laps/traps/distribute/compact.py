@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import typing as t
+
+import numpy as np
+
+from magiccube.collections.laps import TrapCollection
+from magiccube.laps.traps.distribute.algorithm import (
+    AssignmentDistributor,
+    DistributionNode,
+    DistributionNodeTable,
+    NodeContribution,
+    TrapCollectionIndividual,
+    TrapDistribution,
+)
+from magiccube.laps.traps.trap import IntentionType
+
+
+ASSIGNMENT_DTYPE = np.int16
+
+
+class ArrayTrapDistribution(TrapCollectionIndividual):
+    """
+    A trap distribution stored as a single vector mapping node table indexes to trap indexes. Node attributes live in
+    the shared node table, so an individual costs two bytes per node plus the per trap aggregates cached for scoring.
+    The aggregates of every key share one array with a row per key, and dirty traps are kept as one bitmask per row,
+    as per key arrays and sets took more memory than the assignment itself.
+    """
+
+    def __init__(
+        self,
+        node_table: DistributionNodeTable,
+        trap_amount: int,
+        assignment: np.ndarray,
+    ):
+        super().__init__()
+
+        self._node_table = node_table
+        self._trap_amount = trap_amount
+        self._assignment = assignment
+        self._aggregate_keys: t.List[t.Hashable] = []
+        self._trap_aggregates: t.Optional[np.ndarray] = None
+        self._dirty_traps: t.List[int] = []
+
+    @property
+    def node_table(self) -> DistributionNodeTable:
+        return self._node_table
+
+    @property
+    def trap_amount(self) -> int:
+        return self._trap_amount
+
+    @property
+    def assignment(self) -> np.ndarray:
+        return self._assignment
+
+    @property
+    def traps(self) -> t.List[t.List[DistributionNode]]:
+        traps = [[] for _ in range(self._trap_amount)]
+        for node, trap_index in zip(self._node_table.nodes, self._assignment.tolist()):
+            traps[trap_index].append(node)
+        return traps
+
+    def trap_sizes(self) -> np.ndarray:
+        return np.bincount(self._assignment, minlength=self._trap_amount)
+
+    def trap_member_indexes(self, trap_index: int) -> np.ndarray:
+        return np.flatnonzero(self._assignment == trap_index)
+
+    def touch(self, *trap_indexes: int) -> None:
+        mask = 0
+        for trap_index in trap_indexes:
+            mask |= 1 << trap_index
+        for row, dirty_traps in enumerate(self._dirty_traps):
+            self._dirty_traps[row] = dirty_traps | mask
+
+    def update_assignment(self, assignment: np.ndarray) -> None:
+        changed = assignment != self._assignment
+        touched = np.union1d(self._assignment[changed], assignment[changed])
+        self._assignment = assignment.astype(ASSIGNMENT_DTYPE, copy=False)
+        self.touch(*touched.tolist())
+
+    def trap_aggregates(
+        self,
+        key: t.Hashable,
+        aggregate: t.Callable[[DistributionNodeTable, np.ndarray], float],
+        contribution: t.Optional[NodeContribution] = None,
+    ) -> np.ndarray:
+        # Assignments only change through update_assignment, which marks traps dirty, so contributions are unused.
+        try:
+            row = self._aggregate_keys.index(key)
+        except ValueError:
+            aggregates = np.array(
+                [aggregate(self._node_table, self.trap_member_indexes(index)) for index in range(self._trap_amount)],
+                dtype=float,
+            )
+            self._trap_aggregates = (
+                aggregates[np.newaxis]
+                if self._trap_aggregates is None
+                else np.vstack((self._trap_aggregates, aggregates))
+            )
+            self._aggregate_keys.append(key)
+            self._dirty_traps.append(0)
+            return aggregates
+
+        aggregates = self._trap_aggregates[row]
+        dirty_traps = self._dirty_traps[row]
+        while dirty_traps:
+            index = (dirty_traps & -dirty_traps).bit_length() - 1
+            aggregates[index] = aggregate(self._node_table, self.trap_member_indexes(index))
+            dirty_traps &= dirty_traps - 1
+        self._dirty_traps[row] = 0
+
+        return aggregates
+
+    def as_trap_distribution(self) -> TrapDistribution:
+        return TrapDistribution.from_assignment(self._node_table, self._trap_amount, self._assignment)
+
+    def as_trap_collection(
+        self,
+        *,
+        intention_type: IntentionType = IntentionType.GARBAGE,
+    ) -> TrapCollection:
+        return self.as_trap_distribution().as_trap_collection(intention_type=intention_type)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._trap_amount}, {self._assignment})"
+
+
+class ArrayDistributor(AssignmentDistributor[ArrayTrapDistribution]):
+    """
+    Distributor over ArrayTrapDistributions, with the same mutation and crossover operators as Distributor, applied to
+    the assignment vector.
+    """
+
+    def _random_mask(self) -> np.ndarray:
+        node_amount = len(self._node_table)
+        bits = self._random.getrandbits(node_amount) if node_amount else 0
+        return np.unpackbits(
+            np.frombuffer(bits.to_bytes((node_amount + 7) // 8, "little"), dtype=np.uint8),
+            bitorder="little",
+        )[:node_amount].astype(bool)
+
+    def individual_from_assignment(self, trap_amount: int, assignment: np.ndarray) -> ArrayTrapDistribution:
+        return ArrayTrapDistribution(self._node_table, trap_amount, assignment.astype(ASSIGNMENT_DTYPE))
+
+    def create_individual(self) -> ArrayTrapDistribution:
+        return ArrayTrapDistribution(
+            self._node_table,
+            self._trap_amount,
+            np.array(
+                [self._random.randrange(self._trap_amount) for _ in range(len(self._node_table))],
+                dtype=ASSIGNMENT_DTYPE,
+            ),
+        )
+
+    def mutate(self, distribution: ArrayTrapDistribution) -> ArrayTrapDistribution:
+        assignment = distribution.assignment
+        sizes = distribution.trap_sizes()
+        touched = set()
+
+        if self._random.random() > 0.3:
+            for i in range(self._random.randint(1, 5)):
+                selected_index = self._random.choice(np.flatnonzero(sizes).tolist())
+                target_index = self._random.choice(
+                    [index for index in range(distribution.trap_amount) if index != selected_index]
+                )
+                node_index = self._random.choice(np.flatnonzero(assignment == selected_index).tolist())
+                assignment[node_index] = target_index
+                sizes[selected_index] -= 1
+                sizes[target_index] += 1
+                touched.update((selected_index, target_index))
+        else:
+            for i in range(self._random.randint(1, 2)):
+                occupied = np.flatnonzero(sizes).tolist()
+                first_index = self._random.choice(occupied)
+                possible_second_indexes = [index for index in occupied if index != first_index]
+                if not possible_second_indexes:
+                    continue
+                second_index = self._random.choice(possible_second_indexes)
+
+                first = self._random.choice(np.flatnonzero(assignment == first_index).tolist())
+                second = self._random.choice(np.flatnonzero(assignment == second_index).tolist())
+
+                assignment[first] = second_index
+                assignment[second] = first_index
+                touched.update((first_index, second_index))
+
+        distribution.touch(*touched)
+
+        return distribution
+
+    def mate(
+        self,
+        first: ArrayTrapDistribution,
+        second: ArrayTrapDistribution,
+    ) -> t.Tuple[ArrayTrapDistribution, ArrayTrapDistribution]:
+        first_assignment, second_assignment = first.assignment.copy(), second.assignment.copy()
+
+        for distribution in (first, second):
+            distribution.update_assignment(np.where(self._random_mask(), first_assignment, second_assignment))
+
+        return first, second
@@ -15,11 +15,213 @@ from magiccube.collections.nodecollection import ConstrainedNode, NodeCollection
 from magiccube.laps.traps.distribute.algorithm import (
     BaseDistributor,
     DistributionNode,
+    DistributionNodeTable,
     TrapCollectionIndividual,
     TrapDistribution,
+    match_trap_collection,
 )
 from magiccube.laps.traps.trap import IntentionType
-from magiccube.laps.traps.tree.printingtree import AllNode, PrintingNode
+from magiccube.laps.traps.tree.printingtree import PrintingNode
+
+
+class _TrapReferences(object):
+    """
+    Reference counts of the trap indexes a delta modifies, maintained by the tracked containers below as the delta
+    changes, so modified and valid trap index sets do not have to be rebuilt from every source on each lookup.
+    """
+
+    def __init__(self, trap_amount: int):
+        self._all_indexes = frozenset(range(trap_amount))
+        self._counts: t.Dict[int, int] = defaultdict(int)
+        self._removed: t.Set[int] = set()
+        self._modified: t.Optional[t.FrozenSet[int]] = None
+        self._valid: t.Optional[t.FrozenSet[int]] = None
+
+    def add(self, indexes: t.Iterable[int]) -> None:
+        for index in indexes:
+            self._counts[index] += 1
+            if self._counts[index] == 1:
+                self._modified = None
+
+    def remove(self, indexes: t.Iterable[int]) -> None:
+        for index in indexes:
+            self._counts[index] -= 1
+            if not self._counts[index]:
+                del self._counts[index]
+                self._modified = None
+
+    def add_removed(self, index: int) -> None:
+        self._removed.add(index)
+        self._modified = self._valid = None
+
+    def discard_removed(self, index: int) -> None:
+        self._removed.discard(index)
+        self._modified = self._valid = None
+
+    @property
+    def modified(self) -> t.FrozenSet[int]:
+        if self._modified is None:
+            self._modified = frozenset(self._counts.keys() - self._removed)
+        return self._modified
+
+    @property
+    def valid(self) -> t.FrozenSet[int]:
+        if self._valid is None:
+            self._valid = self._all_indexes - self._removed
+        return self._valid
+
+
+class _TrackedList(list):
+    def __init__(self, references: _TrapReferences, values: t.Iterable[int] = ()):
+        super().__init__(values)
+        self._references = references
+        references.add(self)
+
+    def release(self) -> None:
+        if self._references is not None:
+            self._references.remove(self)
+            self._references = None
+
+    def _add(self, indexes: t.Iterable[int]) -> None:
+        if self._references is not None:
+            self._references.add(indexes)
+
+    def _remove(self, indexes: t.Iterable[int]) -> None:
+        if self._references is not None:
+            self._references.remove(indexes)
+
+    def append(self, index: int) -> None:
+        super().append(index)
+        self._add((index,))
+
+    def extend(self, indexes: t.Iterable[int]) -> None:
+        indexes = list(indexes)
+        super().extend(indexes)
+        self._add(indexes)
+
+    def insert(self, position: int, index: int) -> None:
+        super().insert(position, index)
+        self._add((index,))
+
+    def pop(self, position: int = -1) -> int:
+        index = super().pop(position)
+        self._remove((index,))
+        return index
+
+    def remove(self, index: int) -> None:
+        super().remove(index)
+        self._remove((index,))
+
+    def clear(self) -> None:
+        self._remove(self)
+        super().clear()
+
+    def __setitem__(self, position, index) -> None:
+        # A slice assignment may replace a different amount of items than it removes, so what it adds is counted from
+        # the assigned values, not from the slice afterwards.
+        if isinstance(position, slice):
+            removed, added = self[position], list(index)
+        else:
+            removed, added = (self[position],), (index,)
+        super().__setitem__(position, added if isinstance(position, slice) else index)
+        self._remove(removed)
+        self._add(added)
+
+    def __iadd__(self, indexes: t.Iterable[int]) -> _TrackedList:
+        self.extend(indexes)
+        return self
+
+    def __imul__(self, amount: int) -> _TrackedList:
+        if amount > 0:
+            self.extend(list(self) * (amount - 1))
+        else:
+            self.clear()
+        return self
+
+    def __delitem__(self, position) -> None:
+        self._remove(self[position] if isinstance(position, slice) else (self[position],))
+        super().__delitem__(position)
+
+    def __copy__(self) -> t.List[int]:
+        return list(self)
+
+    def __deepcopy__(self, memodict: t.Dict) -> t.List[int]:
+        return list(self)
+
+
+class _TrackedDict(dict):
+    def __init__(self, references: _TrapReferences, items: t.Mapping = ()):
+        super().__init__()
+        self._references = references
+        for key, value in dict(items).items():
+            self[key] = value
+
+    def _referenced(self, key, value) -> t.Iterable[int]:
+        return (value,)
+
+    def _released(self, key, value) -> None:
+        self._references.remove(self._referenced(key, value))
+
+    def release(self) -> None:
+        for key, value in self.items():
+            self._released(key, value)
+
+    def __setitem__(self, key, value) -> None:
+        if key in self:
+            self._released(key, self[key])
+        super().__setitem__(key, value)
+        self._references.add(self._referenced(key, value))
+
+    def __delitem__(self, key) -> None:
+        self._released(key, self[key])
+        super().__delitem__(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._released(key, self[key])
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._released(key, value)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self) -> None:
+        self.release()
+        super().clear()
+
+    def __copy__(self) -> t.Dict:
+        return dict(self)
+
+    def __deepcopy__(self, memodict: t.Dict) -> t.Dict:
+        return copy.deepcopy(dict(self), memodict)
+
+
+class _TrackedNodeMoves(_TrackedDict):
+    def _referenced(self, key: t.Tuple[int, int], value: int) -> t.Iterable[int]:
+        return key[0], value
+
+
+class _TrackedRemovedTraps(_TrackedDict):
+    def _referenced(self, key: int, value: t.List[int]) -> t.Iterable[int]:
+        return ()
+
+    def _released(self, key: int, value: _TrackedList) -> None:
+        value.release()
+        self._references.discard_removed(key)
+
+    def __setitem__(self, key: int, value: t.Iterable[int]) -> None:
+        super().__setitem__(key, _TrackedList(self._references, value))
+        self._references.add_removed(key)
 
 
 class DistributionDelta(TrapCollectionIndividual):
@@ -30,23 +232,24 @@ class DistributionDelta(TrapCollectionIndividual):
         removed_node_indexes: t.FrozenSet[int],
         max_trap_difference: int,
         trap_amount_delta: int = 0,
+        node_table: t.Optional[DistributionNodeTable] = None,
+        rng: t.Optional[random.Random] = None,
     ):
         super().__init__()
 
+        self._random = random.Random() if rng is None else rng
         self._origin = origin
         self._added_nodes = added_nodes
+        self._node_table = (
+            DistributionNodeTable(itertools.chain(*origin.traps, added_nodes)) if node_table is None else node_table
+        )
 
         self._removed_node_indexes = removed_node_indexes
         self._max_trap_difference = max_trap_difference
 
-        self.node_moves: t.Dict[t.Tuple[int, int], int] = {}
-        self.added_node_indexes: t.Dict[DistributionNode, int] = {}
-
         self._trap_amount_delta = trap_amount_delta
 
-        self._all_index_set = frozenset(range(self.trap_amount))
-
-        self.removed_trap_redistributions: t.Dict[int, t.List[int]] = {}
+        self._track({}, {}, {})
 
         for _ in range(self.removed_trap_amount):
             removed_index = self.get_available_trap_index()
@@ -61,7 +264,7 @@ class DistributionDelta(TrapCollectionIndividual):
                 raise Exception("dude what")
 
         for node in self._added_nodes:
-            self.added_node_indexes[node] = random.sample(
+            self.added_node_indexes[node] = self._random.sample(
                 (
                     self.valid_trap_indexes
                     if len(self.modified_trap_indexes) < self._max_trap_difference
@@ -74,6 +277,47 @@ class DistributionDelta(TrapCollectionIndividual):
     def origin(self) -> TrapDistribution:
         return self._origin
 
+    def _track(
+        self,
+        node_moves: t.Mapping[t.Tuple[int, int], int],
+        added_node_indexes: t.Mapping[DistributionNode, int],
+        removed_trap_redistributions: t.Mapping[int, t.Iterable[int]],
+    ) -> None:
+        self._references = _TrapReferences(self.trap_amount)
+        self._references.add(self._removed_node_indexes)
+        self._references.add(range(self._origin.trap_amount, self._origin.trap_amount + self._trap_amount_delta))
+
+        self._node_moves = _TrackedNodeMoves(self._references, node_moves)
+        self._added_node_indexes = _TrackedDict(self._references, added_node_indexes)
+        self._removed_trap_redistributions = _TrackedRemovedTraps(self._references, removed_trap_redistributions)
+
+    @property
+    def node_moves(self) -> t.Dict[t.Tuple[int, int], int]:
+        return self._node_moves
+
+    @node_moves.setter
+    def node_moves(self, node_moves: t.Mapping[t.Tuple[int, int], int]) -> None:
+        self._node_moves.release()
+        self._node_moves = _TrackedNodeMoves(self._references, node_moves)
+
+    @property
+    def added_node_indexes(self) -> t.Dict[DistributionNode, int]:
+        return self._added_node_indexes
+
+    @added_node_indexes.setter
+    def added_node_indexes(self, added_node_indexes: t.Mapping[DistributionNode, int]) -> None:
+        self._added_node_indexes.release()
+        self._added_node_indexes = _TrackedDict(self._references, added_node_indexes)
+
+    @property
+    def removed_trap_redistributions(self) -> t.Dict[int, t.List[int]]:
+        return self._removed_trap_redistributions
+
+    @removed_trap_redistributions.setter
+    def removed_trap_redistributions(self, removed_trap_redistributions: t.Mapping[int, t.Iterable[int]]) -> None:
+        self._removed_trap_redistributions.release()
+        self._removed_trap_redistributions = _TrackedRemovedTraps(self._references, removed_trap_redistributions)
+
     @property
     def trap_amount(self) -> int:
         return self._origin.trap_amount + self._trap_amount_delta
@@ -96,11 +340,11 @@ class DistributionDelta(TrapCollectionIndividual):
 
     @property
     def valid_trap_indexes(self) -> t.FrozenSet[int]:
-        return self._all_index_set - self.removed_trap_redistributions.keys()
+        return self._references.valid
 
     def get_available_trap_index(self) -> int:
         modifications = self.modified_trap_indexes
-        return random.sample(
+        return self._random.sample(
             (
                 self.valid_trap_indexes
                 if len(modifications) < self.max_trap_difference
@@ -135,56 +379,76 @@ class DistributionDelta(TrapCollectionIndividual):
 
     @property
     def modified_trap_indexes(self) -> t.FrozenSet[int]:
-        return (
-            frozenset(
-                itertools.chain(
-                    self._removed_node_indexes,
-                    (index for index, _ in self.node_moves),
-                    self.node_moves.values(),
-                    self.added_node_indexes.values(),
-                    range(self.origin.trap_amount, self.origin.trap_amount + self._trap_amount_delta),
-                    *self.removed_trap_redistributions.values(),
-                )
-            )
-            - self.removed_trap_redistributions.keys()
-        )
+        return self._references.modified
 
     @property
     def trap_distribution(self) -> TrapDistribution:
-        modified_distribution = copy.deepcopy(self._origin)
-
-        for _ in range(self.added_trap_amount):
-            modified_distribution.traps.append([])
+        """
+        The origin with this delta applied. Traps the delta does not touch are shared with the origin, and so are their
+        cached aggregates, so only modified traps are copied and rescored.
+
+        The result is read only. Its unmodified traps are the origin's own lists, so mutating them in place, as
+        Distributor.mutate does, would change the origin and every other delta derived from it. Copy the traps into a
+        new TrapDistribution before modifying them.
+        """
+        traps: t.List[t.List[DistributionNode]] = list(self._origin.traps)
+        traps.extend([] for _ in range(self.added_trap_amount))
+        copied: t.Set[int] = set()
+
+        def writable(_index: int) -> t.List[DistributionNode]:
+            if _index not in copied:
+                traps[_index] = list(traps[_index])
+                copied.add(_index)
+            return traps[_index]
 
         moves: t.List[t.Tuple[DistributionNode, int]] = []
 
-        for index, trap in enumerate(modified_distribution.traps):
-            for from_indexes, to_index in sorted(
-                (item for item in self.node_moves.items() if item[0][0] == index),
-                key=lambda vs: vs[0][1],
-                reverse=True,
-            ):
-                moves.append(
-                    (
-                        trap.pop(from_indexes[1]),
-                        to_index,
-                    )
+        for from_indexes, to_index in sorted(self.node_moves.items(), key=lambda vs: (vs[0][0], -vs[0][1])):
+            moves.append(
+                (
+                    writable(from_indexes[0]).pop(from_indexes[1]),
+                    to_index,
                 )
+            )
 
         for node, index in moves:
-            modified_distribution.traps[index].append(node)
+            writable(index).append(node)
 
         for node, index in self.added_node_indexes.items():
-            modified_distribution.traps[index].append(node)
+            writable(index).append(node)
 
         for from_index, target_indexes in self.removed_trap_redistributions.items():
             for target_index in target_indexes:
-                modified_distribution.traps[target_index].append(modified_distribution.traps[from_index].pop(0))
+                writable(target_index).append(writable(from_index).pop(0))
+
+        origin_indexes = [
+            None if index in copied or index >= len(self._origin.traps) else index for index in range(len(traps))
+        ]
 
         for index in sorted(self.removed_trap_redistributions, reverse=True):
-            del modified_distribution.traps[index]
+            del traps[index]
+            del origin_indexes[index]
+
+        return TrapDistribution(
+            traps=traps,
+            node_table=self._node_table,
+            origin=self._origin,
+            origin_indexes=origin_indexes,
+        )
 
-        return modified_distribution
+    def __deepcopy__(self, memodict: t.Dict) -> DistributionDelta:
+        # The origin is never modified through a delta, and the random generator is the distributor's, so copies
+        # share both. Tracked containers copy as plain containers, and the reference counts of the copy are rebuilt
+        # from them.
+        memodict[id(self._origin)] = self._origin
+        memodict[id(self._random)] = self._random
+        result = copy.copy(self)
+        memodict[id(self)] = result
+        result.__dict__.update(copy.deepcopy(self.__dict__, memodict))
+
+        result._track(result._node_moves, result._added_node_indexes, result._removed_trap_redistributions)
+
+        return result
 
     def as_trap_collection(self, *, intention_type: IntentionType = IntentionType.GARBAGE) -> TrapCollection:
         return self.trap_distribution.as_trap_collection()
@@ -199,21 +463,15 @@ def trap_collection_to_trap_distribution(
     for distribution_node in nodes:
         constraint_map[distribution_node.node].append(distribution_node)
 
-    distribution: t.List[t.List[DistributionNode]] = [[] for _ in range(len(traps))]
-    removed: t.List[t.Tuple[PrintingNode, int]] = []
-
-    for index, trap in enumerate(traps):
-        for child in trap.node.children:
-            printing_node = child if isinstance(child, PrintingNode) else AllNode((child,))
-
-            try:
-                distribution[index].append(DistributionNode(constraint_map[printing_node].pop()))
-            except (KeyError, IndexError):
-                removed.append((printing_node, index))
+    distribution, removed = match_trap_collection(traps, constraint_map)
 
     added = list(itertools.chain(*(nodes for nodes in constraint_map.values())))
 
-    return TrapDistribution(traps=distribution), added, removed
+    return (
+        TrapDistribution(traps=[[DistributionNode(node) for node in trap] for trap in distribution]),
+        added,
+        removed,
+    )
 
 
 class DeltaDistributor(BaseDistributor[DistributionDelta]):
@@ -231,7 +489,7 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
         super().__init__(
             distribution_nodes,
             trap_amount,
-            lambda i: constraints(i.trap_distribution),
+            constraints,
             model_blue_print,
             logger,
             **kwargs,
@@ -244,16 +502,27 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
             original_collection,
             NodeCollection(node.as_constrained_node for node in distribution_nodes),
         )
-        self._original_distribution = original_distribution
         self._added = list(map(DistributionNode, added))
         self._removed = removed
+        self._delta_node_table = DistributionNodeTable(itertools.chain(*original_distribution.traps, self._added))
+        self._original_distribution = TrapDistribution(
+            traps=original_distribution.traps,
+            node_table=self._delta_node_table,
+        )
+
+    def evaluated_distribution(self, individual: DistributionDelta) -> TrapDistribution:
+        return individual.trap_distribution
+
+    @property
+    def evaluation_node_table(self) -> DistributionNodeTable:
+        return self._delta_node_table
 
     def mutate(self, delta: DistributionDelta) -> DistributionDelta:
         for i in range(5):
-            if random.random() < 0.8:
+            if self._random.random() < 0.8:
                 modified_indexes = delta.modified_trap_indexes
 
-                from_trap_index = random.sample(
+                from_trap_index = self._random.sample(
                     (
                         delta.valid_trap_indexes
                         if len(modified_indexes) < delta.max_trap_difference
@@ -273,7 +542,7 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
                 if not node_index_options:
                     continue
 
-                node_index = random.sample(node_index_options, 1)[0]
+                node_index = self._random.sample(node_index_options, 1)[0]
 
                 from_trap_index_set = frozenset((from_trap_index,))
 
@@ -286,18 +555,18 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
                 if not possible_trap_indexes_to:
                     continue
 
-                delta.node_moves[(from_trap_index, node_index)] = random.sample(possible_trap_indexes_to, 1)[0]
+                delta.node_moves[(from_trap_index, node_index)] = self._random.sample(possible_trap_indexes_to, 1)[0]
 
             else:
                 if not delta.node_moves:
                     continue
 
-                del delta.node_moves[random.choice(list(delta.node_moves))]
+                del delta.node_moves[self._random.choice(list(delta.node_moves))]
 
         if delta.added_node_indexes:
             for i in range(2):
-                if random.random() < 0.2:
-                    moved_node = random.choice(list(delta.added_node_indexes))
+                if self._random.random() < 0.2:
+                    moved_node = self._random.choice(list(delta.added_node_indexes))
                     from_trap_index = delta.added_node_indexes[moved_node]
 
                     del delta.added_node_indexes[moved_node]
@@ -315,11 +584,11 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
                     if not possible_trap_indexes_to:
                         continue
 
-                    delta.added_node_indexes[moved_node] = random.sample(possible_trap_indexes_to, 1)[0]
+                    delta.added_node_indexes[moved_node] = self._random.sample(possible_trap_indexes_to, 1)[0]
 
         if delta.removed_trap_redistributions:
             for _ in range(2):
-                if random.random() < 0.05:
+                if self._random.random() < 0.05:
                     unremove_choices = list(
                         delta.removed_trap_redistributions
                         if len(delta.modified_trap_indexes) < delta.max_trap_difference
@@ -329,9 +598,9 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
                     if not unremove_choices:
                         break
 
-                    unremoved_index = random.choice(list(unremove_choices))
+                    unremoved_index = self._random.choice(list(unremove_choices))
 
-                    new_removed_index = random.sample(
+                    new_removed_index = self._random.sample(
                         delta.valid_trap_indexes,
                         1,
                     )[0]
@@ -344,9 +613,11 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
                     delta.evacuate_removed_trap(new_removed_index)
 
             for _ in range(5):
-                if random.random() < 0.1:
-                    trap = delta.removed_trap_redistributions[random.choice(list(delta.removed_trap_redistributions))]
-                    trap[random.randint(0, len(trap) - 1)] = delta.get_available_trap_index()
+                if self._random.random() < 0.1:
+                    trap = delta.removed_trap_redistributions[
+                        self._random.choice(list(delta.removed_trap_redistributions))
+                    ]
+                    trap[self._random.randint(0, len(trap) - 1)] = delta.get_available_trap_index()
 
         return delta
 
@@ -384,20 +655,22 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
             modified = set()
             modified.update(delta.removed_node_indexes)
             delta.removed_trap_redistributions = {}
-            for index, distribution_options in random.sample(removed_distributions.items(), delta.removed_trap_amount):
+            for index, distribution_options in self._random.sample(
+                removed_distributions.items(), delta.removed_trap_amount
+            ):
                 delta.removed_trap_redistributions[index] = []
                 modified.add(index)
 
                 for options in zip(*distribution_options):
                     if len(modified) < delta.max_trap_difference:
-                        target_index = random.choice(options)
+                        target_index = self._random.choice(options)
                         delta.removed_trap_redistributions[index].append(target_index)
                         modified.add(target_index)
 
                     else:
                         moved = False
                         options = list(options)
-                        random.shuffle(options)
+                        self._random.shuffle(options)
                         for target_index in options:
                             if target_index in modified:
                                 delta.removed_trap_redistributions[index].append(target_index)
@@ -406,12 +679,14 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
 
                         if not moved:
                             delta.removed_trap_redistributions[index].append(
-                                random.sample(delta.valid_trap_indexes & modified, 1)[0]
+                                self._random.sample(delta.valid_trap_indexes & modified, 1)[0]
                             )
 
             node_moves = {}
 
-            for from_indexes, to_index in random.sample(moves.items(), random.randint(min_moves, max_moves)):
+            for from_indexes, to_index in self._random.sample(
+                moves.items(), self._random.randint(min_moves, max_moves)
+            ):
                 if len(modified) >= delta.max_trap_difference:
                     break
 
@@ -430,7 +705,7 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
                 if len(modified) >= delta.max_trap_difference:
                     possible_indexes = modified
 
-                index = random.sample(possible_indexes, 1)[0]
+                index = self._random.sample(possible_indexes, 1)[0]
                 modified.add(index)
                 delta.added_node_indexes[added_node] = index
 
@@ -439,6 +714,28 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
 
         return first, second
 
+    def encode_population(self, population: t.Sequence[DistributionDelta]) -> t.List[t.Tuple[t.Any, ...]]:
+        return [
+            (
+                dict(delta.node_moves),
+                {self._delta_node_table.index(node): index for node, index in delta.added_node_indexes.items()},
+                {index: list(targets) for index, targets in delta.removed_trap_redistributions.items()},
+            )
+            for delta in population
+        ]
+
+    def decode_population(self, encoded: t.List[t.Tuple[t.Any, ...]]) -> t.List[DistributionDelta]:
+        population = []
+        for node_moves, added_node_indexes, removed_trap_redistributions in encoded:
+            delta = self.create_individual()
+            delta.node_moves = node_moves
+            delta.added_node_indexes = {
+                self._delta_node_table.nodes[node_index]: index for node_index, index in added_node_indexes.items()
+            }
+            delta.removed_trap_redistributions = removed_trap_redistributions
+            population.append(delta)
+        return population
+
     def create_individual(self) -> DistributionDelta:
         return DistributionDelta(
             origin=self._original_distribution,
@@ -446,4 +743,6 @@ class DeltaDistributor(BaseDistributor[DistributionDelta]):
             removed_node_indexes=frozenset(_index for _, _index in self._removed),
             max_trap_difference=self._max_trap_delta,
             trap_amount_delta=self._trap_amount - len(self._original_collection),
+            node_table=self._delta_node_table,
+            rng=self._random,
         )
@@ -1,14 +1,30 @@
 from __future__ import annotations
 
 import math
+import multiprocessing
+import os
 import queue
+import random
 import threading
+import time
 import typing as t
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from multiprocessing.connection import Connection
 
+from evolution import logging
 from evolution.environment import Environment
 from evolution.logging import FitnessLoggingOperation
 
+from magiccube.laps.traps.distribute.algorithm import (
+    AssignmentDistributor,
+    BaseDistributor,
+    TrapDistribution,
+)
+from magiccube.laps.traps.distribute.checkpoint import CheckpointWriter, read_checkpoint
+from magiccube.laps.traps.distribute.compact import ArrayTrapDistribution
+from magiccube.laps.traps.distribute.polish import LocalSearch
+
 
 E = t.TypeVar("E", bound=Environment)
 
@@ -35,6 +51,28 @@ class GenerationAmountAutoPause(AutoPauseCheck):
         self._generations += self._backoff
 
 
+class _LoggingOperationIndex(object):
+    """
+    Index of the first operation of a type in a logger's operations, looked up once per logger.
+    """
+
+    def __init__(self, logging_operator: t.Type[FitnessLoggingOperation]):
+        self._logging_operator_type = logging_operator
+        self._logger: t.Optional[logging.Logger] = None
+        self._index: t.Optional[int] = None
+
+    def get(self, logger: logging.Logger) -> int:
+        if logger is not self._logger:
+            for idx, operation in enumerate(logger.operations.values()):
+                if isinstance(operation, self._logging_operator_type):
+                    self._index = idx
+                    break
+            else:
+                raise ValueError("Invalid logging operator")
+            self._logger = logger
+        return self._index
+
+
 class FitnessDifferentialAutoPause(AutoPauseCheck):
     def __init__(
         self,
@@ -45,7 +83,7 @@ class FitnessDifferentialAutoPause(AutoPauseCheck):
         generations_lookback: int = 100,
     ):
         self._threshold = threshold
-        self._logging_operator_type = logging_operator
+        self._operation_index = _LoggingOperationIndex(logging_operator)
         self._backoff = backoff
         self._generations_lookback = generations_lookback
 
@@ -53,13 +91,7 @@ class FitnessDifferentialAutoPause(AutoPauseCheck):
         if len(worker.distributor.logger.values) < self._generations_lookback:
             return False
 
-        operation_index = None
-        for idx, operation in enumerate(worker.distributor.logger.operations.values()):
-            if isinstance(operation, self._logging_operator_type):
-                operation_index = idx
-                break
-        if operation_index is None:
-            raise ValueError("Invalid logging operator")
+        operation_index = self._operation_index.get(worker.distributor.logger)
 
         return (
             worker.distributor.logger.values[-1][operation_index]
@@ -67,31 +99,161 @@ class FitnessDifferentialAutoPause(AutoPauseCheck):
         ) / self._generations_lookback < self._threshold
 
     def resume(self, worker: DistributionWorker) -> None:
-        self._threshold *= self._backoffgatherer
+        self._threshold *= self._backoff
+
+
+class TimeBudgetAutoPause(AutoPauseCheck):
+    """
+    Pauses once the worker has spent seconds generating. Time is measured between checks, which happen once per
+    generation, so time spent paused does not count towards the budget. Resuming extends the budget by backoff.
+    """
+
+    def __init__(self, seconds: float, backoff: t.Optional[float] = None):
+        self._seconds = seconds
+        self._backoff = seconds / 10 if backoff is None else backoff
+        self._elapsed = 0.0
+        self._last_check: t.Optional[float] = None
+
+    def check(self, worker: DistributionWorker) -> bool:
+        now = time.monotonic()
+        if self._last_check is not None:
+            self._elapsed += now - self._last_check
+        self._last_check = now
+        return self._elapsed >= self._seconds
+
+    def resume(self, worker: DistributionWorker) -> None:
+        self._seconds += self._backoff
+        self._last_check = time.monotonic()
+
+
+class StagnationAutoPause(AutoPauseCheck):
+    """
+    Pauses when the value logged by logging_operator, by default the fitness of the best individual, has not improved
+    by more than min_improvement for generations generations. Resuming grants another generations generations.
+    """
+
+    def __init__(
+        self,
+        generations: int,
+        logging_operator: t.Type[FitnessLoggingOperation] = logging.LogMax,
+        *,
+        min_improvement: float = 0.0,
+    ):
+        self._generations = generations
+        self._operation_index = _LoggingOperationIndex(logging_operator)
+        self._min_improvement = min_improvement
+        self._best: t.Optional[float] = None
+        self._best_generation = 0
+        self._checked_generations = 0
+
+    def check(self, worker: DistributionWorker) -> bool:
+        values = worker.distributor.logger.values
+        operation_index = self._operation_index.get(worker.distributor.logger)
+
+        for generation in range(self._checked_generations, len(values)):
+            value = values[generation][operation_index]
+            if self._best is None or value > self._best + self._min_improvement:
+                self._best = value
+                self._best_generation = generation
+        self._checked_generations = len(values)
+
+        return len(values) - 1 - self._best_generation >= self._generations
+
+    def resume(self, worker: DistributionWorker) -> None:
+        self._best_generation = max(len(worker.distributor.logger.values) - 1, 0)
+
+
+class FrameQueue(queue.Queue):
+    """
+    Message queue holding at most max_frames frame messages. Putting a frame on a full queue drops the oldest queued
+    frame, so a slow consumer only misses intermediate generations. Messages of any other type are never dropped.
+
+    Listeners are called with every message put on the queue, on the putting thread while the queue is locked, so they
+    must not block or touch the queue.
+    """
+
+    def __init__(self, max_frames: t.Optional[int] = None):
+        if max_frames is not None and max_frames < 1:
+            raise ValueError("max_frames must be at least 1")
+        super().__init__()
+        self._max_frames = max_frames
+        self._frames = 0
+        self._listeners: t.List[t.Callable[[t.Dict[str, t.Any]], None]] = []
+        self.dropped_frames = 0
+
+    def add_listener(self, listener: t.Callable[[t.Dict[str, t.Any]], None]) -> None:
+        self._listeners.append(listener)
+
+    def _put(self, item: t.Dict[str, t.Any]) -> None:
+        if item["type"] == "frame":
+            if self._max_frames is not None and self._frames >= self._max_frames:
+                for index, queued in enumerate(self.queue):
+                    if queued["type"] == "frame":
+                        del self.queue[index]
+                        break
+                self.unfinished_tasks -= 1
+                self.dropped_frames += 1
+            else:
+                self._frames += 1
+        self.queue.append(item)
+        for listener in self._listeners:
+            listener(item)
+
+    def _get(self) -> t.Dict[str, t.Any]:
+        item = self.queue.popleft()
+        if item["type"] == "frame":
+            self._frames -= 1
+        return item
 
 
 class DistributionWorker(threading.Thread, t.Generic[E]):
+    """
+    Runs a distributor on its own thread, reporting frames and status changes on message_queue.
+
+    By default every generation is reported. With frame_interval and/or frame_interval_ms set, frames are coalesced,
+    and only the latest frame is reported once that many generations or milliseconds have passed since the last one.
+    A pending frame is always reported before a status change. max_frames bounds the amount of frames waiting on the
+    queue, dropping the oldest when the consumer falls behind, max_frames=1 keeps only the latest frame.
+    """
+
     def __init__(
         self,
         distributor: E,
         *,
         pause_conditions: t.Iterable[AutoPauseCheck] = (),
         max_generations: int = 0,
+        polisher: t.Optional[LocalSearch] = None,
+        checkpoint_path: t.Optional[str] = None,
+        checkpoint_interval: int = 100,
+        max_frames: t.Optional[int] = None,
+        frame_interval: t.Optional[int] = None,
+        frame_interval_ms: t.Optional[float] = None,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self._distributor: E = distributor
         self._max_generations = max_generations
         self._pause_conditions = pause_conditions
+        self._polisher = polisher
+        self._checkpoint_path = checkpoint_path
+        self._checkpoint_interval = checkpoint_interval
+        self._checkpoint_writer: t.Optional[CheckpointWriter] = None
 
         self._running: bool = False
         self._terminating = threading.Event()
         self._pause_lock = threading.Lock()
         self._communication_lock = threading.Lock()
-        self._message_queue = queue.Queue()
+        self._message_queue = FrameQueue(max_frames)
+
+        self._frame_interval = frame_interval
+        self._frame_interval_ms = frame_interval_ms
+        self._frame_lock = threading.Lock()
+        self._pending_frame: t.Optional[t.Dict[str, t.Any]] = None
+        self._pending_generations = 0
+        self._last_frame_time = time.monotonic()
 
     @property
-    def message_queue(self) -> queue.Queue[t.Dict[str, t.Any]]:
+    def message_queue(self) -> FrameQueue:
         return self._message_queue
 
     @property
@@ -99,17 +261,99 @@ class DistributionWorker(threading.Thread, t.Generic[E]):
         # UNSAFE
         return self._distributor
 
-    def _notify_status(self, status: str) -> None:
+    def _close(self) -> None:
+        self._checkpoint()
+        if self._checkpoint_writer is not None:
+            self._checkpoint_writer.close()
+        if isinstance(self._distributor, BaseDistributor):
+            self._distributor.close()
+
+    def restore_checkpoint(self, path: t.Optional[str] = None) -> bool:
+        """
+        Restore the distributor from a checkpoint, by default the one this worker writes to. Must be called before the
+        worker is started. Returns False if there is no checkpoint to restore from.
+        """
+        path = self._checkpoint_path if path is None else path
+        if path is None or not os.path.exists(path):
+            return False
+        self._distributor.restore(read_checkpoint(path))
+        return True
+
+    def _checkpoint(self) -> None:
+        if self._checkpoint_path is None or not isinstance(self._distributor, BaseDistributor):
+            return
+        if self._checkpoint_writer is None:
+            self._checkpoint_writer = CheckpointWriter(self._checkpoint_path)
+            self._checkpoint_writer.start()
+        self._checkpoint_writer.submit(self._distributor.snapshot())
+
+    def _fittest_distribution(self) -> t.Optional[TrapDistribution]:
+        if isinstance(self._distributor, BaseDistributor):
+            fittest = self._distributor.fittest()
+            if fittest and isinstance(fittest[0], TrapDistribution):
+                return fittest[0]
+            if fittest and isinstance(fittest[0], ArrayTrapDistribution):
+                return fittest[0].as_trap_distribution()
+        return None
+
+    def _polish(self) -> None:
+        if self._polisher is None:
+            return
+
+        distribution = self._fittest_distribution()
+        if distribution is None:
+            return
+
+        self._polisher.polish(
+            distribution,
+            on_improvement=lambda polished, score: self._message_queue.put(
+                {
+                    "type": "polish",
+                    "distribution": polished,
+                    "score": score,
+                }
+            ),
+            should_stop=lambda: self._running or self._terminating.is_set(),
+        )
+
+    def _put_pending_frame(self) -> None:
+        self._pending_frame["coalesced"] = self._pending_generations
+        self._message_queue.put(self._pending_frame)
+        self._pending_frame = None
+        self._pending_generations = 0
+        self._last_frame_time = time.monotonic()
+
+    def _flush_frame(self) -> None:
+        with self._frame_lock:
+            if self._pending_frame is not None:
+                self._put_pending_frame()
+
+    def _offer_frame(self, message: t.Dict[str, t.Any]) -> None:
+        with self._frame_lock:
+            self._pending_frame = message
+            self._pending_generations += 1
+
+            if self._frame_interval is None and self._frame_interval_ms is None:
+                self._put_pending_frame()
+            elif (self._frame_interval is not None and self._pending_generations >= self._frame_interval) or (
+                self._frame_interval_ms is not None
+                and (time.monotonic() - self._last_frame_time) * 1000 >= self._frame_interval_ms
+            ):
+                self._put_pending_frame()
+
+    def _notify_status(self, status: str, **kwargs) -> None:
+        self._flush_frame()
         self._message_queue.put(
             {
                 "type": "status",
                 "status": status,
+                **kwargs,
             }
         )
 
-    def stop(self):
+    def stop(self) -> bool:
         if self._terminating.is_set():
-            return
+            return False
         with self._communication_lock:
             self._notify_status("stopping")
             self._running = False
@@ -118,23 +362,25 @@ class DistributionWorker(threading.Thread, t.Generic[E]):
                 self._pause_lock.release()
             except RuntimeError:
                 pass
+        return True
 
-    def pause(self):
+    def pause(self) -> bool:
         if self._terminating.is_set():
-            return
+            return False
         with self._communication_lock:
             if not self._running:
-                return
+                return False
             self._notify_status("pausing")
             self._pause_lock.acquire(blocking=False)
             self._running = False
+        return True
 
-    def resume(self):
+    def resume(self) -> bool:
         if self._terminating.is_set():
-            return
+            return False
         with self._communication_lock:
             if self._running:
-                return
+                return False
             self._notify_status("resuming")
             try:
                 self._pause_lock.release()
@@ -143,6 +389,7 @@ class DistributionWorker(threading.Thread, t.Generic[E]):
             self._running = True
             for condition in self._pause_conditions:
                 condition.resume(self)
+        return True
 
     def run(self) -> None:
         self._running = True
@@ -154,21 +401,30 @@ class DistributionWorker(threading.Thread, t.Generic[E]):
                 self._notify_status("running")
 
             while self._running:
-                self._message_queue.put(
-                    {
-                        "type": "frame",
-                        "frame": self._distributor.spawn_generation(),
-                    }
-                )
+                frame = self._distributor.spawn_generation()
+
+                message = {
+                    "type": "frame",
+                    "frame": frame,
+                    "generation": len(self._distributor.logger.values),
+                }
+
+                if isinstance(self._distributor, BaseDistributor) and self._distributor.instrumented:
+                    # A frame carries finished timings, so the time queueing it is counted in the next generation.
+                    message["timings"] = self._distributor.last_timings.as_dict()
+                    start = time.perf_counter()
+                    self._offer_frame(message)
+                    self._distributor.record_timing("queue", time.perf_counter() - start)
+                else:
+                    self._offer_frame(message)
+
+                if self._checkpoint_interval and not len(self._distributor.logger.values) % self._checkpoint_interval:
+                    self._checkpoint()
 
                 if self._max_generations and len(self._distributor.logger.values) >= self._max_generations:
-                    self._message_queue.put(
-                        {
-                            "type": "status",
-                            "status": "completed",
-                            "generations": len(self._distributor.logger.values),
-                        }
-                    )
+                    self._notify_status("completed", generations=len(self._distributor.logger.values))
+                    self._running = False
+                    self._polish()
                     self.stop()
 
                 if any(condition.check(self) for condition in self._pause_conditions):
@@ -176,5 +432,222 @@ class DistributionWorker(threading.Thread, t.Generic[E]):
 
             if not self._running and not self._terminating.is_set():
                 self._notify_status("paused")
+                self._checkpoint()
+                self._polish()
+
+        self._close()
 
         self._notify_status("stopped")
+
+
+def _run_island(
+    distributor_factory: t.Callable[[random.Random], AssignmentDistributor],
+    connection: Connection,
+    seed: t.Optional[int],
+) -> None:
+    distributor = distributor_factory(random.Random(seed))
+
+    try:
+        while True:
+            command, argument = connection.recv()
+
+            if command == "spawn":
+                distributor.spawn_generation()
+                connection.send(distributor.logger.values[-1])
+
+            elif command == "emigrate":
+                connection.send(
+                    [
+                        (distributor.fitness(individual), individual.trap_amount, individual.assignment)
+                        for individual in distributor.fittest(argument)
+                    ]
+                )
+
+            elif command == "immigrate":
+                distributor.replace_weakest(
+                    [
+                        distributor.evaluate(distributor.individual_from_assignment(trap_amount, assignment))
+                        for _, trap_amount, assignment in argument
+                    ]
+                )
+                connection.send(None)
+
+            elif command == "operations":
+                connection.send(distributor.logger.operations)
+
+            elif command == "close":
+                break
+
+            else:
+                raise ValueError(f"Unknown island command {command}")
+
+    finally:
+        distributor.close()
+        connection.close()
+
+
+class IslandLogger(object):
+    def __init__(self, operations: t.Mapping[str, FitnessLoggingOperation]):
+        self.operations = OrderedDict(operations)
+        self.values: t.List[t.Tuple[float, ...]] = []
+
+    def merge_frames(self, frames: t.Sequence[t.Tuple[float, ...]]) -> t.Tuple[float, ...]:
+        return tuple(
+            max(values) if isinstance(operation, logging.LogMax) else sum(values) / len(values)
+            for operation, values in zip(self.operations.values(), zip(*frames))
+        )
+
+
+class IslandSet(object):
+    """
+    Independent AssignmentDistributor populations in separate processes, stepped a generation at a time. Every
+    migration_interval generations the migration_size fittest individuals of each island replace the weakest of the
+    next island in a ring. Individuals travel as assignment arrays, so every island must be built by the same
+    (picklable) factory over the same nodes. The factory receives the random generator the island's distributor should
+    use, seeded from seed and the island index when a seed is given.
+
+    Exposes spawn_generation and a logger merging island frames (max of maxes, mean of everything else), so it can be
+    driven by a DistributionWorker and checked by its AutoPauseChecks.
+    """
+
+    def __init__(
+        self,
+        distributor_factory: t.Callable[[random.Random], AssignmentDistributor],
+        island_amount: int,
+        *,
+        migration_interval: int = 20,
+        migration_size: int = 5,
+        seed: t.Optional[int] = None,
+    ):
+        self._distributor_factory = distributor_factory
+        self._island_amount = island_amount
+        self._migration_interval = migration_interval
+        self._migration_size = migration_size
+        self._seed = seed
+
+        self._lock = threading.Lock()
+        self._processes: t.List[multiprocessing.Process] = []
+        self._connections: t.List[Connection] = []
+        self._logger: t.Optional[IslandLogger] = None
+        self._template: t.Optional[AssignmentDistributor] = None
+
+    def _start(self) -> None:
+        if self._processes:
+            return
+
+        for index in range(self._island_amount):
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_island,
+                args=(
+                    self._distributor_factory,
+                    child_connection,
+                    None if self._seed is None else self._seed + index,
+                ),
+            )
+            process.start()
+            child_connection.close()
+            self._processes.append(process)
+            self._connections.append(connection)
+
+        self._connections[0].send(("operations", None))
+        self._logger = IslandLogger(self._connections[0].recv())
+
+    def _broadcast(self, command: str, argument: t.Any = None) -> t.List[t.Any]:
+        for connection in self._connections:
+            connection.send((command, argument))
+        return [connection.recv() for connection in self._connections]
+
+    @property
+    def logger(self) -> IslandLogger:
+        with self._lock:
+            self._start()
+            return self._logger
+
+    def migrate(self) -> None:
+        with self._lock:
+            self._start()
+            emigrants = self._broadcast("emigrate", self._migration_size)
+            for connection, immigrants in zip(self._connections, emigrants[-1:] + emigrants[:-1]):
+                connection.send(("immigrate", immigrants))
+            for connection in self._connections:
+                connection.recv()
+
+    def spawn_generation(self) -> t.Tuple[float, ...]:
+        with self._lock:
+            self._start()
+            frame = self._logger.merge_frames(self._broadcast("spawn"))
+            self._logger.values.append(frame)
+
+        if self._island_amount > 1 and not len(self._logger.values) % self._migration_interval:
+            self.migrate()
+
+        return frame
+
+    def fittest(self, amount: int = 1) -> t.List[t.Tuple[float, t.Any]]:
+        with self._lock:
+            self._start()
+            candidates = sorted(
+                (candidate for island in self._broadcast("emigrate", amount) for candidate in island),
+                key=lambda candidate: candidate[0],
+                reverse=True,
+            )[:amount]
+
+        if self._template is None:
+            self._template = self._distributor_factory(random.Random())
+
+        return [
+            (fitness, self._template.individual_from_assignment(trap_amount, assignment))
+            for fitness, trap_amount, assignment in candidates
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.send(("close", None))
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in self._processes:
+                process.join()
+            for connection in self._connections:
+                connection.close()
+            self._processes = []
+            self._connections = []
+
+
+class IslandDistributionWorker(DistributionWorker[IslandSet]):
+    def __init__(
+        self,
+        distributor_factory: t.Callable[[random.Random], AssignmentDistributor],
+        island_amount: int,
+        *,
+        migration_interval: int = 20,
+        migration_size: int = 5,
+        seed: t.Optional[int] = None,
+        pause_conditions: t.Iterable[AutoPauseCheck] = (),
+        max_generations: int = 0,
+        **kwargs,
+    ):
+        super().__init__(
+            IslandSet(
+                distributor_factory,
+                island_amount,
+                migration_interval=migration_interval,
+                migration_size=migration_size,
+                seed=seed,
+            ),
+            pause_conditions=pause_conditions,
+            max_generations=max_generations,
+            **kwargs,
+        )
+
+    def _close(self) -> None:
+        self._distributor.close()
+
+    def _fittest_distribution(self) -> t.Optional[TrapDistribution]:
+        fittest = self._distributor.fittest()
+        if not fittest:
+            return None
+        distribution = fittest[0][1]
+        return distribution.as_trap_distribution() if isinstance(distribution, ArrayTrapDistribution) else distribution
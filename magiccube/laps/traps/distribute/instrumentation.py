@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import functools
+import threading
+import time
+import typing as t
+from collections import defaultdict
+
+import numpy as np
+
+
+PERCENTILES = (50, 90, 99)
+
+_active = threading.local()
+
+
+class GenerationTimings(object):
+    """
+    Seconds spent in each phase of a generation, and scoring each constraint. Whatever part of the generation no phase
+    accounts for is attributed to selection, which happens inside the evolution model. Phases added as external are
+    spent outside spawning the generation, and count towards its total on top of the spawning time.
+    """
+
+    def __init__(self):
+        self.phases: t.Dict[str, float] = defaultdict(float)
+        self.constraints: t.Dict[str, float] = defaultdict(float)
+        self.total: float = 0.0
+        self._external: float = 0.0
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] += seconds
+
+    def add_external(self, phase: str, seconds: float) -> None:
+        self.phases[phase] += seconds
+        self._external += seconds
+
+    def add_constraint(self, description: str, seconds: float) -> None:
+        self.constraints[description] += seconds
+
+    def finish(self, total: float) -> None:
+        self.total = total + self._external
+        self.phases["selection"] = max(self.total - sum(self.phases.values()), 0.0)
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        return {
+            "total": self.total,
+            "phases": dict(self.phases),
+            "constraints": dict(self.constraints),
+        }
+
+
+def activate(timings: t.Optional[GenerationTimings]) -> None:
+    _active.timings = timings
+
+
+def timed_score(score: t.Callable[[t.Any, t.Any], float]) -> t.Callable[[t.Any, t.Any], float]:
+    """
+    Records the time spent in a constraint's score method in the timings active on the current thread, if any.
+    """
+
+    @functools.wraps(score)
+    def wrapper(self, distribution) -> float:
+        timings = getattr(_active, "timings", None)
+        if timings is None:
+            return score(self, distribution)
+        start = time.perf_counter()
+        try:
+            return score(self, distribution)
+        finally:
+            timings.add_constraint(self.description, time.perf_counter() - start)
+
+    return wrapper
+
+
+def _distribution(samples: t.Sequence[float]) -> t.Dict[str, float]:
+    values = np.asarray(samples, dtype=float)
+    summary = {"mean": float(values.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = float(value)
+    return summary
+
+
+def summarize_timings(history: t.Sequence[GenerationTimings]) -> t.Dict[str, t.Any]:
+    if not history:
+        return {"generations": 0, "generations_per_second": 0.0, "phases": {}, "constraints": {}}
+
+    total = sum(timings.total for timings in history)
+    phases = sorted({phase for timings in history for phase in timings.phases})
+    constraints = sorted({description for timings in history for description in timings.constraints})
+
+    return {
+        "generations": len(history),
+        "generations_per_second": len(history) / total if total else 0.0,
+        "phases": {phase: _distribution([timings.phases.get(phase, 0.0) for timings in history]) for phase in phases},
+        "constraints": {
+            description: _distribution([timings.constraints.get(description, 0.0) for timings in history])
+            for description in constraints
+        },
+    }
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import time
+import typing as t
+
+from magiccube.laps.traps.distribute.algorithm import (
+    BaseDistributor,
+    DistributionNode,
+    TrapDistribution,
+)
+
+
+_Move = t.Tuple[int, int, int, t.Optional[int]]
+
+
+class LocalSearch(object):
+    """
+    Hill climbing over single node moves and pairwise swaps between traps, taking the first improving move until no
+    move improves the distribution, the time budget runs out or should_stop returns True.
+
+    Candidates are applied in place and only the traps they touch are marked dirty, so each is scored from the cached
+    aggregates of the remaining traps. Distributions are evaluated by distributor, and by default the value being
+    maximised is its weighted fitness, so polishing optimises what the distributor selects for. objective instead
+    reduces the constraint scores to that value. time_budget is in seconds, None polishes until no move improves.
+    """
+
+    def __init__(
+        self,
+        distributor: BaseDistributor,
+        *,
+        objective: t.Optional[t.Callable[[t.Tuple[float, ...]], float]] = None,
+        time_budget: t.Optional[float] = 30.0,
+    ):
+        self._distributor = distributor
+        self._objective = objective
+        self._time_budget = time_budget
+
+    def score(self, distribution: TrapDistribution) -> float:
+        self._distributor.evaluate(distribution)
+        if self._objective is None:
+            return self._distributor.fitness(distribution)
+        return self._objective(distribution.fitness)
+
+    @staticmethod
+    def _candidates(traps: t.List[t.List[DistributionNode]]) -> t.Iterator[_Move]:
+        for from_index, trap in enumerate(traps):
+            for node_index in range(len(trap)):
+                for to_index in range(len(traps)):
+                    if to_index != from_index:
+                        yield from_index, node_index, to_index, None
+
+        for first_index, first_trap in enumerate(traps):
+            for second_index in range(first_index + 1, len(traps)):
+                for first_node_index in range(len(first_trap)):
+                    for second_node_index in range(len(traps[second_index])):
+                        yield first_index, first_node_index, second_index, second_node_index
+
+    @staticmethod
+    def _apply(distribution: TrapDistribution, move: _Move) -> None:
+        traps = distribution.traps
+        from_index, node_index, to_index, other_node_index = move
+        if other_node_index is None:
+            traps[to_index].append(traps[from_index].pop(node_index))
+        else:
+            traps[from_index][node_index], traps[to_index][other_node_index] = (
+                traps[to_index][other_node_index],
+                traps[from_index][node_index],
+            )
+        distribution.touch(from_index, to_index)
+
+    @staticmethod
+    def _revert(distribution: TrapDistribution, move: _Move) -> None:
+        traps = distribution.traps
+        from_index, node_index, to_index, other_node_index = move
+        if other_node_index is None:
+            traps[from_index].insert(node_index, traps[to_index].pop())
+            distribution.touch(from_index, to_index)
+        else:
+            LocalSearch._apply(distribution, move)
+
+    def polish(
+        self,
+        distribution: TrapDistribution,
+        *,
+        on_improvement: t.Optional[t.Callable[[TrapDistribution, float], None]] = None,
+        should_stop: t.Optional[t.Callable[[], bool]] = None,
+    ) -> t.Tuple[TrapDistribution, float]:
+        distribution = TrapDistribution(
+            traps=[list(trap) for trap in distribution.traps],
+            node_table=distribution.node_table,
+        )
+        deadline = None if self._time_budget is None else time.monotonic() + self._time_budget
+        best = self.score(distribution)
+
+        improved = True
+        while improved:
+            improved = False
+
+            for move in self._candidates(distribution.traps):
+                if (deadline is not None and time.monotonic() > deadline) or (
+                    should_stop is not None and should_stop()
+                ):
+                    return distribution, best
+
+                self._apply(distribution, move)
+                score = self.score(distribution)
+
+                if score > best:
+                    best = score
+                    improved = True
+                    if on_improvement is not None:
+                        on_improvement(
+                            TrapDistribution(
+                                traps=[list(trap) for trap in distribution.traps],
+                                node_table=distribution.node_table,
+                            ),
+                            best,
+                        )
+                    break
+
+                self._revert(distribution, move)
+
+        return distribution, best
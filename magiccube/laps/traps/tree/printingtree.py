@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import itertools
 import os
+import threading
 import typing as t
+import weakref
 from abc import abstractmethod
 from functools import cached_property
 
@@ -28,14 +30,44 @@ N = t.TypeVar("N")
 T = t.TypeVar("T", bound=t.Union[Cardboard, Printing])
 
 
+_INTERNED_NODES: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+_INTERN_LOCK = threading.Lock()
+
+
 class BaseNode(Serializeable, PersistentHashable, t.Generic[N, T]):
     _MINIMAL_STRING_CONNECTOR: str
     _children: FrozenMultiset[t.Union[N, T]]
+    _hash: t.Optional[int]
+    _memoized_persistent_hash: t.Optional[str]
+
+    def __new__(cls, children: t.Union[t.Iterable[t.Union[N, T]], t.Mapping[t.Union[N, T], int]]):
+        children = children if isinstance(children, FrozenMultiset) else FrozenMultiset(children)
+        key = (cls, children)
+
+        with _INTERN_LOCK:
+            node = _INTERNED_NODES.get(key)
+            if node is None:
+                node = super().__new__(cls)
+                node._children = children
+                node._hash = None
+                node._memoized_persistent_hash = None
+                _INTERNED_NODES[key] = node
+
+        return node
+
+    def __init__(self, children: t.Union[t.Iterable[t.Union[N, T]], t.Mapping[t.Union[N, T], int]]):
+        # Nodes are interned, and fully initialized by __new__.
+        pass
 
     @property
     def id(self):
         return self.persistent_hash()
 
+    def persistent_hash(self) -> str:
+        if self._memoized_persistent_hash is None:
+            self._memoized_persistent_hash = super().persistent_hash()
+        return self._memoized_persistent_hash
+
     @property
     @abstractmethod
     def children(self) -> FrozenMultiset[t.Union[N, T]]:
@@ -98,10 +130,25 @@ class BaseNode(Serializeable, PersistentHashable, t.Generic[N, T]):
                 )
 
     def __hash__(self) -> int:
-        return hash((self.__class__, self._children))
+        if self._hash is None:
+            self._hash = hash((self.__class__, self._children))
+        return self._hash
 
     def __eq__(self, other: BaseNode) -> bool:
-        return isinstance(other, self.__class__) and self._children == other._children
+        return self is other or (
+            isinstance(other, self.__class__)
+            and self.__hash__() == other.__hash__()
+            and self._children == other._children
+        )
+
+    def __reduce__(self) -> t.Tuple[t.Type[BaseNode], t.Tuple[FrozenMultiset[t.Union[N, T]]]]:
+        return self.__class__, (self._children,)
+
+    def __copy__(self) -> BaseNode:
+        return self
+
+    def __deepcopy__(self, memodict: t.Dict) -> BaseNode:
+        return self
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self._children})"
@@ -118,12 +165,6 @@ class CardboardNode(BaseNode["CardboardNode", Cardboard]):
     flattened: t.Iterator[t.Union[Cardboard, CardboardAnyNode]]
     flattened_options: t.Iterator[FrozenMultiset[Cardboard]]
 
-    def __init__(
-        self,
-        children: t.Union[t.Iterable[CardboardNodeChild], t.Mapping[CardboardNodeChild, int]],
-    ):
-        self._children = FrozenMultiset(children)
-
     @property
     def sorted_items(self) -> t.List[t.Tuple[CardboardNodeChild, int]]:
         return sorted(
@@ -208,12 +249,6 @@ class PrintingNode(BaseNode["PrintingNode", Printing]):
     flattened: t.Iterator[t.Union[Printing, AnyNode]]
     flattened_options: t.Iterator[FrozenMultiset[Printing]]
 
-    def __init__(
-        self,
-        children: t.Union[t.Iterable[PrintingNodeChild], t.Mapping[PrintingNodeChild, int]],
-    ):
-        self._children = FrozenMultiset(children)
-
     @property
     def children(self) -> FrozenMultiset[PrintingNodeChild]:
         return self._children
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import copy
 import itertools
+import threading
 import typing as t
 from abc import abstractmethod
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from enum import Enum
 
 from mtgorp.models.collections.cardboardset import CardboardSet
@@ -20,6 +20,7 @@ from yeetlong.multiset import FrozenMultiset, Multiset
 
 from magiccube.collections.cube import Cube, Cubeable
 from magiccube.collections.delta import CubeDeltaOperation
+from magiccube.collections.digest import DigestHashable, element_digest
 from magiccube.collections.infinites import InfinitesDeltaOperation
 from magiccube.collections.laps import TrapCollection
 from magiccube.collections.meta import MetaCube
@@ -838,7 +839,124 @@ class VerboseCubePatch(Serializeable):
         )
 
 
-class CubePatch(Serializeable, PersistentHashable):
+MAXIMUM_MATCHING_COMPONENT_SIZE = 16
+
+
+def _best_component_selection(
+    component: t.List[int],
+    requirements: t.List[t.List[t.Tuple[Printing, int]]],
+    sizes: t.List[int],
+    available: t.Dict[Printing, int],
+    initial: t.List[int],
+) -> t.List[int]:
+    remaining = {printing: available[printing] for index in component for printing, _ in requirements[index]}
+    suffix_sizes = list(itertools.accumulate(reversed([sizes[index] for index in component])))[::-1] + [0]
+
+    best_key = (sum(sizes[index] for index in initial), len(initial))
+    best = list(initial)
+    selected = []
+
+    def search(position: int, covered: int) -> None:
+        nonlocal best_key, best
+        if (covered + suffix_sizes[position], len(selected) + len(component) - position) <= best_key:
+            return
+        if position == len(component):
+            best_key, best = (covered, len(selected)), list(selected)
+            return
+
+        index = component[position]
+        if all(remaining[printing] >= multiplicity for printing, multiplicity in requirements[index]):
+            for printing, multiplicity in requirements[index]:
+                remaining[printing] -= multiplicity
+            selected.append(index)
+            search(position + 1, covered + sizes[index])
+            selected.pop()
+            for printing, multiplicity in requirements[index]:
+                remaining[printing] += multiplicity
+
+        search(position + 1, covered)
+
+    search(0, 0)
+    return best
+
+
+def _match_nodes_to_printings(
+    nodes: t.Iterable[ConstrainedNode],
+    printings: Multiset[Printing],
+    *,
+    maximum: bool = False,
+    component_size_limit: int = MAXIMUM_MATCHING_COMPONENT_SIZE,
+) -> t.List[ConstrainedNode]:
+    """
+    Selects unnested nodes whose printings can all be taken from printings together, largest nodes first.
+
+    With maximum, candidates are split into components of nodes competing for the same printings, through an index
+    from printing to candidate nodes. In components of at most component_size_limit candidates the selection covering
+    the most printings is then searched for exhaustively, starting from the greedy selection, so the result never
+    covers fewer printings than the greedy one. Larger components keep the greedy selection.
+    """
+    available = dict(printings.items())
+
+    candidates = sorted(
+        (
+            node
+            for node in nodes
+            if all(isinstance(child, Printing) for child in node.node.children)
+            and all(available.get(child, 0) >= multiplicity for child, multiplicity in node.node.children.items())
+        ),
+        key=lambda node: len(node.node.children),
+        reverse=True,
+    )
+    requirements = [list(node.node.children.items()) for node in candidates]
+    sizes = [len(node.node.children) for node in candidates]
+
+    remaining = dict(available)
+    selected = set()
+
+    for index, requirement in enumerate(requirements):
+        if all(remaining[printing] >= multiplicity for printing, multiplicity in requirement):
+            for printing, multiplicity in requirement:
+                remaining[printing] -= multiplicity
+            selected.add(index)
+
+    if maximum:
+        candidates_by_printing: t.Dict[Printing, t.List[int]] = defaultdict(list)
+        for index, requirement in enumerate(requirements):
+            for printing, _ in requirement:
+                candidates_by_printing[printing].append(index)
+
+        parents = list(range(len(candidates)))
+
+        def find(index: int) -> int:
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        for indexes in candidates_by_printing.values():
+            for index in indexes[1:]:
+                parents[find(index)] = find(indexes[0])
+
+        components: t.Dict[int, t.List[int]] = defaultdict(list)
+        for index in range(len(candidates)):
+            components[find(index)].append(index)
+
+        for component in components.values():
+            if 1 < len(component) <= component_size_limit:
+                greedy = [index for index in component if index in selected]
+                selected.difference_update(greedy)
+                selected.update(_best_component_selection(component, requirements, sizes, available, greedy))
+
+    return [candidates[index] for index in sorted(selected)]
+
+
+class CubePatch(Serializeable, DigestHashable):
+    """
+    The persistent hash of a patch is a digest hash combining the digests of its cube and node delta operations, which
+    they carry through patch arithmetic, with the hashes of its small group map and infinites deltas. Hashes from the
+    sorted scheme, over the sorted hashes of the operations, still verify.
+    """
+
     def __init__(
         self,
         cube_delta_operation: t.Optional[CubeDeltaOperation] = None,
@@ -891,7 +1009,11 @@ class CubePatch(Serializeable, PersistentHashable):
             ),
         )
 
-    def as_verbose(self, meta_cube: MetaCube) -> VerboseCubePatch:
+    def as_verbose(self, meta_cube: MetaCube, *, maximum_matching: bool = False) -> VerboseCubePatch:
+        """
+        Describes the patch as changes to meta_cube. With maximum_matching, printings added to or removed from nodes
+        are matched to cover as many printings as possible, instead of greedily taking the largest nodes first.
+        """
         group_updates = set()
 
         for group, new_weight in self.group_map_delta_operation.groups.items():
@@ -977,44 +1099,22 @@ class CubePatch(Serializeable, PersistentHashable):
                 new_printings.remove(_new, 1)
                 removed_printings.remove(_removed, 1)
 
-        new_unnested_nodes = sorted(
-            (node for node in new_nodes if all(isinstance(child, Printing) for child in node.node.children)),
-            key=lambda node: len(node.node.children),
-            reverse=True,
-        )
-
         printings_moved_to_nodes = Multiset()
 
-        for node in new_unnested_nodes:
-            if node.node.children <= removed_printings:
-                printings_moved_to_nodes.add(
-                    (
-                        node.node.children,
-                        node,
-                    )
-                )
-                removed_printings -= node.node.children
+        for node in _match_nodes_to_printings(new_nodes, removed_printings, maximum=maximum_matching):
+            printings_moved_to_nodes.add((node.node.children, node))
+            for printing, multiplicity in node.node.children.items():
+                removed_printings.remove(printing, multiplicity)
 
         for _, node in printings_moved_to_nodes:
             new_nodes.remove(node, 1)
 
-        removed_unnested_nodes = sorted(
-            (node for node in removed_nodes if all(isinstance(child, Printing) for child in node.node.children)),
-            key=lambda node: len(node.node.children),
-            reverse=True,
-        )
-
         nodes_moved_to_printings = Multiset()
 
-        for node in removed_unnested_nodes:
-            if node.node.children <= new_printings:
-                nodes_moved_to_printings.add(
-                    (
-                        node.node.children,
-                        node,
-                    )
-                )
-                new_printings -= node.node.children
+        for node in _match_nodes_to_printings(removed_nodes, new_printings, maximum=maximum_matching):
+            nodes_moved_to_printings.add((node.node.children, node))
+            for printing, multiplicity in node.node.children.items():
+                new_printings.remove(printing, multiplicity)
 
         for _, node in nodes_moved_to_printings:
             removed_nodes.remove(node, 1)
@@ -1059,14 +1159,19 @@ class CubePatch(Serializeable, PersistentHashable):
             removed_laps.remove(trap, 1)
             new_nodes.remove(node, 1)
 
+        # removed_nodes_by_node still holds exactly the nodes left in removed_nodes, reversed so pop matches each new
+        # node with the first removed node with the same printing node.
+        for nodes in removed_nodes_by_node.values():
+            nodes.reverse()
+
         altered_nodes = []
 
         for new_node in new_nodes:
-            for removed_node in copy.copy(removed_nodes):
-                if new_node.node == removed_node.node:
-                    removed_nodes.remove(removed_node, 1)
-                    altered_nodes.append([removed_node, new_node])
-                    break
+            removed_candidates = removed_nodes_by_node.get(new_node.node)
+            if removed_candidates:
+                removed_node = removed_candidates.pop()
+                removed_nodes.remove(removed_node, 1)
+                altered_nodes.append([removed_node, new_node])
 
         for _, new_node in altered_nodes:
             new_nodes.remove(new_node, 1)
@@ -1120,9 +1225,17 @@ class CubePatch(Serializeable, PersistentHashable):
             ),
         )
 
+    def _element_digests(self) -> t.Iterable[t.Tuple[int, int]]:
+        return (
+            (element_digest(f"cube:{self._cube_delta_operation.digest:064x}"), 1),
+            (element_digest(f"nodes:{self._node_delta_operation.digest:064x}"), 1),
+            (element_digest(f"groups:{self._group_map_delta_operation.persistent_hash()}"), 1),
+            (element_digest(f"infinites:{self._infinites_delta_operation.persistent_hash()}"), 1),
+        )
+
     def _calc_persistent_hash(self) -> t.Iterator[t.ByteString]:
-        yield self._cube_delta_operation.persistent_hash().encode("ASCII")
-        yield self._node_delta_operation.persistent_hash().encode("ASCII")
+        yield self._cube_delta_operation.sorted_persistent_hash().encode("ASCII")
+        yield self._node_delta_operation.sorted_persistent_hash().encode("ASCII")
         yield self._group_map_delta_operation.persistent_hash().encode("ASCII")
         yield self._infinites_delta_operation.persistent_hash().encode("ASCII")
 
@@ -1188,6 +1301,141 @@ class CubePatch(Serializeable, PersistentHashable):
         )
 
 
+class CubePatchAccumulator(object):
+    """
+    Mutable sum of CubePatches. Adding a patch only touches the entries that patch changes, so folding a long patch
+    history costs time proportional to the total size of the patches, where summing CubePatches copies the
+    accumulated operations at every step.
+    """
+
+    def __init__(self, patches: t.Iterable[CubePatch] = ()):
+        self._cubeables: t.Dict[Cubeable, int] = {}
+        self._nodes: t.Dict[ConstrainedNode, int] = {}
+        self._groups: t.Dict[str, float] = {}
+        self._added_infinites: t.Set[Cardboard] = set()
+        self._removed_infinites: t.Set[Cardboard] = set()
+
+        self.extend(patches)
+
+    @staticmethod
+    def _add_multiplicities(target: t.Dict[t.Any, t.Any], items: t.Iterable[t.Tuple[t.Any, t.Any]]) -> None:
+        for item, multiplicity in items:
+            multiplicity = target.get(item, 0) + multiplicity
+            if multiplicity:
+                target[item] = multiplicity
+            else:
+                target.pop(item, None)
+
+    def add(self, patch: CubePatch) -> CubePatchAccumulator:
+        self._add_multiplicities(self._cubeables, patch.cube_delta_operation.cubeables.items())
+        self._add_multiplicities(self._nodes, patch.node_delta_operation.nodes.items())
+        self._add_multiplicities(self._groups, patch.group_map_delta_operation.groups.items())
+
+        added_infinites = patch.infinites_delta_operation.added.cardboards
+        removed_infinites = patch.infinites_delta_operation.removed.cardboards
+        for cardboard in itertools.chain(added_infinites, removed_infinites):
+            added = cardboard in self._added_infinites or cardboard in added_infinites
+            removed = cardboard in self._removed_infinites or cardboard in removed_infinites
+            if added and removed:
+                self._added_infinites.discard(cardboard)
+                self._removed_infinites.discard(cardboard)
+            elif added:
+                self._added_infinites.add(cardboard)
+            else:
+                self._removed_infinites.add(cardboard)
+
+        return self
+
+    __iadd__ = add
+
+    def extend(self, patches: t.Iterable[CubePatch]) -> CubePatchAccumulator:
+        for patch in patches:
+            self.add(patch)
+        return self
+
+    def as_patch(self) -> CubePatch:
+        return CubePatch(
+            cube_delta_operation=CubeDeltaOperation(self._cubeables),
+            node_delta_operation=NodesDeltaOperation(self._nodes),
+            group_map_delta_operation=GroupMapDeltaOperation(self._groups),
+            infinites_delta_operation=InfinitesDeltaOperation(
+                CardboardSet(self._added_infinites),
+                CardboardSet(self._removed_infinites),
+            ),
+        )
+
+    def apply(self, meta_cube: MetaCube) -> MetaCube:
+        return self.as_patch() + meta_cube
+
+
+class VerboseCubePatchCache(object):
+    """
+    Bounded LRU cache of CubePatch.as_verbose results, keyed by the persistent hashes of the meta cube and the patch.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self._max_size = max_size
+        self._entries: OrderedDict[t.Tuple[str, str, bool], VerboseCubePatch] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, patch: CubePatch, meta_cube: MetaCube, *, maximum_matching: bool = False) -> VerboseCubePatch:
+        key = (meta_cube.persistent_hash(), patch.persistent_hash(), maximum_matching)
+
+        with self._lock:
+            verbose_patch = self._entries.get(key)
+            if verbose_patch is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return verbose_patch
+            self._misses += 1
+
+        verbose_patch = patch.as_verbose(meta_cube, maximum_matching=maximum_matching)
+
+        with self._lock:
+            self._entries[key] = verbose_patch
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+        return verbose_patch
+
+    def invalidate(self, *, meta_cube: t.Optional[MetaCube] = None, patch: t.Optional[CubePatch] = None) -> None:
+        """
+        Drop entries for meta_cube and/or patch, or every entry if neither is given.
+        """
+        meta_cube_hash = None if meta_cube is None else meta_cube.persistent_hash()
+        patch_hash = None if patch is None else patch.persistent_hash()
+
+        with self._lock:
+            for key in [
+                key
+                for key in self._entries
+                if (meta_cube_hash is None or key[0] == meta_cube_hash)
+                and (patch_hash is None or key[1] == patch_hash)
+            ]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+
 class CubeUpdater(object):
     def __init__(
         self,
@@ -1269,4 +1517,7 @@ class CubeUpdater(object):
         if new_garbage is None:
             return self.new_cube
         else:
-            return self.new_cube - Cube(self.new_cube.garbage_traps) + Cube(new_garbage)
+            return self.new_cube + (
+                CubeDeltaOperation(new_garbage.traps.elements())
+                - CubeDeltaOperation(self.new_cube.garbage_traps.elements())
+            )
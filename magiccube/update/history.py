@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import sqlite3
+import typing as t
+
+from mtgorp.models.serilization.serializeable import Inflator
+from mtgorp.models.serilization.strategies.jsonid import JsonId
+
+from magiccube.collections.meta import MetaCube
+from magiccube.update.cubeupdate import CubePatch, CubePatchAccumulator
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    version INTEGER PRIMARY KEY,
+    meta_cube TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS patches (
+    version INTEGER PRIMARY KEY,
+    patch TEXT NOT NULL
+);
+"""
+
+
+class CubeHistoryStore(object):
+    """
+    History of a single MetaCube in an SQLite database, as the log of patches applied to it plus full snapshots of the
+    cube every snapshot_interval versions. Version 0 is the cube the history was initialized with, and version n the
+    cube after the first n patches.
+
+    Getting the cube at any version loads the nearest earlier snapshot and applies at most snapshot_interval - 1
+    patches to it. Changing snapshot_interval only affects snapshots taken from then on.
+    """
+
+    def __init__(self, path: str, inflator: Inflator, *, snapshot_interval: int = 50):
+        if snapshot_interval < 1:
+            raise ValueError("snapshot_interval must be at least 1")
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+        self._strategy = JsonId(inflator)
+        self.snapshot_interval = snapshot_interval
+
+    @property
+    def latest_version(self) -> t.Optional[int]:
+        """
+        The latest version in the history, or None if it has not been initialized.
+        """
+        if self._connection.execute("SELECT 1 FROM snapshots WHERE version = 0").fetchone() is None:
+            return None
+        (version,) = self._connection.execute("SELECT MAX(version) FROM patches").fetchone()
+        return 0 if version is None else version
+
+    def initialize(self, meta_cube: MetaCube) -> None:
+        if self.latest_version is not None:
+            raise ValueError("History already initialized")
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO snapshots (version, meta_cube) VALUES (0, ?)",
+                (JsonId.serialize(meta_cube),),
+            )
+
+    def append(self, patch: CubePatch) -> int:
+        """
+        Appends patch to the history and returns the new version. If the new version gets a snapshot, the snapshot is
+        derived from the stored history, so it always agrees with the patch log.
+        """
+        latest_version = self.latest_version
+        if latest_version is None:
+            raise ValueError("History not initialized")
+        version = latest_version + 1
+
+        meta_cube = patch + self.meta_cube_at(latest_version) if not version % self.snapshot_interval else None
+
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO patches (version, patch) VALUES (?, ?)",
+                (version, JsonId.serialize(patch)),
+            )
+            if not version % self.snapshot_interval:
+                self._connection.execute(
+                    "INSERT INTO snapshots (version, meta_cube) VALUES (?, ?)",
+                    (version, JsonId.serialize(meta_cube)),
+                )
+
+        return version
+
+    def _check_version(self, version: int) -> None:
+        latest_version = self.latest_version
+        if latest_version is None:
+            raise ValueError("History not initialized")
+        if not 0 <= version <= latest_version:
+            raise ValueError(f"No version {version}, latest version is {latest_version}")
+
+    def _accumulate(self, from_version: int, to_version: int) -> CubePatchAccumulator:
+        return CubePatchAccumulator(
+            self._strategy.deserialize(CubePatch, patch)
+            for (patch,) in self._connection.execute(
+                "SELECT patch FROM patches WHERE version > ? AND version <= ? ORDER BY version",
+                (from_version, to_version),
+            )
+        )
+
+    def patch_between(self, from_version: int, to_version: int) -> CubePatch:
+        """
+        The sum of the patches taking the cube from from_version to to_version, where from_version <= to_version.
+        """
+        self._check_version(to_version)
+        if not 0 <= from_version <= to_version:
+            raise ValueError(f"Invalid version range {from_version} to {to_version}")
+        return self._accumulate(from_version, to_version).as_patch()
+
+    def meta_cube_at(self, version: int) -> MetaCube:
+        self._check_version(version)
+
+        snapshot_version, meta_cube = self._connection.execute(
+            "SELECT version, meta_cube FROM snapshots WHERE version <= ? ORDER BY version DESC LIMIT 1",
+            (version,),
+        ).fetchone()
+
+        meta_cube = self._strategy.deserialize(MetaCube, meta_cube)
+        if snapshot_version == version:
+            return meta_cube
+
+        return self._accumulate(snapshot_version, version).apply(meta_cube)
+
+    def latest(self) -> MetaCube:
+        return self.meta_cube_at(self.latest_version)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> CubeHistoryStore:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
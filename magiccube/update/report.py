@@ -51,9 +51,7 @@ class ChangedSize(ReportNotification):
 
     @classmethod
     def check(cls, updater: CubeUpdater) -> t.Optional[ChangedSize]:
-        new_cube = updater.cube + updater.patch.cube_delta_operation
-
-        size_delta = len(new_cube) - len(updater.cube)
+        size_delta = len(updater.new_cube) - len(updater.cube)
         if size_delta == 0:
             return None
 
@@ -342,7 +340,7 @@ class CardboardChange(ReportNotification):
         new_no_garbage_cube = Cube(
             (
                 cubeable
-                for cubeable in (updater.cube + updater.patch.cube_delta_operation).cubeables
+                for cubeable in updater.new_cube.cubeables
                 if not (isinstance(cubeable, Trap) and cubeable.intention_type == IntentionType.GARBAGE)
             )
         )
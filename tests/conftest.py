@@ -0,0 +1,16 @@
+import typing as t
+
+import pytest
+from mtgorp.db.database import CardDatabase
+from mtgorp.db.load import PickleLoader
+from mtgorp.models.persistent.printing import Printing
+
+
+@pytest.fixture(scope="session")
+def db() -> CardDatabase:
+    return PickleLoader().load()
+
+
+@pytest.fixture(scope="session")
+def printings(db: CardDatabase) -> t.List[Printing]:
+    return sorted(db.printings.values(), key=lambda printing: printing.id)[:64]
@@ -0,0 +1,90 @@
+import pickle
+import random
+import typing as t
+
+import pytest
+from mtgorp.models.persistent.printing import Printing
+from yeetlong.multiset import FrozenMultiset
+
+from magiccube.collections.cube import Cube
+from magiccube.collections.delta import CubeDeltaOperation
+from magiccube.laps.traps.trap import IntentionType, Trap
+from magiccube.laps.traps.tree.printingtree import AllNode
+
+
+@pytest.fixture
+def cubeables(printings: t.List[Printing]) -> t.List:
+    return printings[:24] + [
+        Trap(
+            AllNode(printings[24 + 2 * index : 26 + 2 * index]),
+            IntentionType.GARBAGE if index % 2 else IntentionType.SYNERGY,
+        )
+        for index in range(8)
+    ]
+
+
+def _views(cube: Cube) -> t.Tuple[FrozenMultiset, ...]:
+    return cube.models, cube.traps, cube.garbage_traps, cube.tickets, cube.purples, cube.laps
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("partition", (False, True))
+def test_derived_cubes_match_rebuilt_cubes(seed: int, partition: bool, cubeables: t.List):
+    rng = random.Random(seed)
+    cube = Cube(rng.choice(cubeables) for _ in range(30))
+    expected = dict(cube.cubeables.items())
+    cube.persistent_hash()
+    if partition:
+        _views(cube)
+
+    for _ in range(40):
+        delta = {rng.choice(cubeables): rng.randint(-2, 2) for _ in range(rng.randint(1, 4))}
+        if rng.random() < 0.5:
+            cube += CubeDeltaOperation(delta)
+        else:
+            cube -= CubeDeltaOperation(delta)
+            delta = {cubeable: -amount for cubeable, amount in delta.items()}
+
+        for cubeable, amount in delta.items():
+            expected[cubeable] = max(expected.get(cubeable, 0) + amount, 0)
+
+        rebuilt = Cube({cubeable: multiplicity for cubeable, multiplicity in expected.items() if multiplicity})
+
+        assert len(cube) == len(rebuilt)
+        assert cube.persistent_hash() == rebuilt.persistent_hash()
+        if partition:
+            assert _views(cube) == _views(rebuilt)
+
+    assert cube == rebuilt
+    assert _views(cube) == _views(rebuilt)
+
+
+def test_derivation_is_lazy(cubeables: t.List):
+    cube = Cube(cubeables)
+    _views(cube)
+
+    derived = cube + CubeDeltaOperation({cubeables[0]: 1, cubeables[-1]: -1})
+
+    assert derived._cubeables is None
+    assert derived.traps == cube.traps - FrozenMultiset((cubeables[-1],))
+    assert derived._cubeables is None
+    assert derived.cubeables == cube.cubeables + FrozenMultiset((cubeables[0],)) - FrozenMultiset((cubeables[-1],))
+
+
+def test_overlay_depth_is_bounded(cubeables: t.List):
+    cube = Cube(cubeables)
+    for index in range(Cube.MAX_OVERLAY_DEPTH * 3):
+        cube += CubeDeltaOperation({cubeables[index % len(cubeables)]: 1})
+        assert cube._depth <= Cube.MAX_OVERLAY_DEPTH
+
+    assert len(cube) == len(cubeables) + Cube.MAX_OVERLAY_DEPTH * 3
+
+
+def test_pickled_derived_cube_drops_parent(cubeables: t.List):
+    derived = Cube(cubeables) - CubeDeltaOperation({cubeables[0]: 1})
+
+    unpickled = pickle.loads(pickle.dumps(derived))
+
+    assert unpickled._parent is None
+    assert len(unpickled) == len(derived)
+    assert unpickled.persistent_hash() == derived.persistent_hash()
@@ -0,0 +1,51 @@
+import random
+import typing as t
+
+import pytest
+from mtgorp.db.database import CardDatabase
+from mtgorp.models.persistent.printing import Printing
+
+from magiccube.collections.cube import Cube
+from magiccube.collections.infinites import Infinites
+from magiccube.collections.meta import MetaCube
+from magiccube.collections.nodecollection import (
+    ConstrainedNode,
+    GroupMap,
+    NodeCollection,
+)
+from magiccube.laps.traps.tree.printingtree import AllNode
+from magiccube.update.cubeupdate import CubePatch
+from magiccube.update.history import CubeHistoryStore
+
+
+def _random_meta_cube(rng: random.Random, printings: t.Sequence[Printing]) -> MetaCube:
+    return MetaCube(
+        Cube(rng.sample(printings[:32], 12) * rng.randint(1, 2)),
+        NodeCollection(
+            ConstrainedNode(1, AllNode((printing,)), ["a"]) for printing in rng.sample(printings[32:48], 4)
+        ),
+        GroupMap({group: rng.choice((0.5, 1.0)) for group in rng.sample(("a", "b", "c"), 2)}),
+        Infinites(printing.cardboard for printing in rng.sample(printings[48:], 3)),
+    )
+
+
+@pytest.mark.parametrize("snapshot_interval", (1, 4, 50))
+def test_meta_cubes_round_trip(
+    snapshot_interval: int,
+    db: CardDatabase,
+    printings: t.List[Printing],
+    tmp_path,
+):
+    rng = random.Random(snapshot_interval)
+    meta_cubes = [_random_meta_cube(rng, printings) for _ in range(10)]
+
+    with CubeHistoryStore(str(tmp_path / "history.db"), db, snapshot_interval=snapshot_interval) as store:
+        store.initialize(meta_cubes[0])
+        for version, (previous, current) in enumerate(zip(meta_cubes, meta_cubes[1:]), start=1):
+            assert store.append(CubePatch.from_meta_delta(previous, current)) == version
+
+    with CubeHistoryStore(str(tmp_path / "history.db"), db, snapshot_interval=snapshot_interval) as store:
+        assert store.latest_version == len(meta_cubes) - 1
+        for version, meta_cube in enumerate(meta_cubes):
+            assert store.meta_cube_at(version) == meta_cube
+        assert store.patch_between(2, 7) + meta_cubes[2] == meta_cubes[7]
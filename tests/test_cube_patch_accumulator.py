@@ -0,0 +1,51 @@
+import functools
+import operator
+import random
+import typing as t
+
+import pytest
+from mtgorp.models.collections.cardboardset import CardboardSet
+from mtgorp.models.persistent.printing import Printing
+
+from magiccube.collections.delta import CubeDeltaOperation
+from magiccube.collections.infinites import InfinitesDeltaOperation
+from magiccube.collections.nodecollection import (
+    ConstrainedNode,
+    GroupMapDeltaOperation,
+    NodesDeltaOperation,
+)
+from magiccube.laps.traps.tree.printingtree import AllNode
+from magiccube.update.cubeupdate import CubePatch, CubePatchAccumulator
+
+
+GROUPS = ("a", "b", "c")
+
+
+def _random_patch(rng: random.Random, printings: t.Sequence[Printing]) -> CubePatch:
+    cardboards = [printing.cardboard for printing in rng.sample(printings[:8], 2)]
+    return CubePatch(
+        CubeDeltaOperation({printing: rng.choice((-2, -1, 1, 2)) for printing in rng.sample(printings[:16], 4)}),
+        NodesDeltaOperation(
+            {
+                ConstrainedNode(1, AllNode((printing,)), rng.sample(GROUPS, 1)): rng.choice((-1, 1))
+                for printing in rng.sample(printings[16:24], 2)
+            }
+        ),
+        GroupMapDeltaOperation({group: rng.choice((-0.5, 0.5, 1.0)) for group in rng.sample(GROUPS, 2)}),
+        InfinitesDeltaOperation(*(CardboardSet((cardboard,)) for cardboard in cardboards)),
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_accumulator_matches_folded_sum(seed: int, printings: t.List[Printing]):
+    rng = random.Random(seed)
+    patches = [_random_patch(rng, printings) for _ in range(50)]
+
+    folded = functools.reduce(operator.add, patches)
+    accumulated = CubePatchAccumulator(patches).as_patch()
+
+    assert accumulated.cube_delta_operation == folded.cube_delta_operation
+    assert accumulated.node_delta_operation == folded.node_delta_operation
+    assert accumulated.group_map_delta_operation == folded.group_map_delta_operation
+    assert accumulated.infinites_delta_operation == folded.infinites_delta_operation
+    assert accumulated.persistent_hash() == folded.persistent_hash()
@@ -0,0 +1,58 @@
+import random
+
+from magiccube.laps.traps.distribute.algorithm import (
+    DetachedDistributionNode,
+    TrapDistribution,
+)
+from magiccube.laps.traps.distribute.delta import DistributionDelta
+
+
+def test_trap_distribution_shares_only_unmodified_traps():
+    rng = random.Random(0)
+    nodes = [DetachedDistributionNode(value=1.0, groups=frozenset(), image_amount=1) for _ in range(40)]
+    origin = TrapDistribution(nodes, 8)
+    origin_traps = [list(trap) for trap in origin.traps]
+
+    delta = DistributionDelta(
+        origin=origin,
+        added_nodes=[DetachedDistributionNode(value=2.0, groups=frozenset(), image_amount=1)],
+        removed_node_indexes=frozenset(),
+        max_trap_difference=3,
+        rng=rng,
+    )
+    delta.node_moves[(0, 0)] = 1
+    delta.node_moves[(2, 1)] = 0
+
+    distribution = delta.trap_distribution
+
+    assert 0 < len(delta.modified_trap_indexes) < distribution.trap_amount
+    for index, trap in enumerate(distribution.traps):
+        if index in delta.modified_trap_indexes:
+            assert trap is not origin.traps[index]
+        else:
+            assert trap is origin.traps[index]
+
+    assert origin.traps == origin_traps
+
+
+def test_modified_trap_indexes_follow_slice_assignments():
+    nodes = [DetachedDistributionNode(value=1.0, groups=frozenset(), image_amount=1) for _ in range(40)]
+    delta = DistributionDelta(
+        origin=TrapDistribution(nodes, 8),
+        added_nodes=[],
+        removed_node_indexes=frozenset(),
+        max_trap_difference=8,
+        rng=random.Random(0),
+    )
+    delta.removed_trap_redistributions = {7: [1, 2]}
+    redistribution = delta.removed_trap_redistributions[7]
+
+    redistribution[0:1] = [4, 5, 5]
+    assert delta.modified_trap_indexes == {2, 4, 5}
+
+    redistribution += [6]
+    redistribution[1:] = [3]
+    assert delta.modified_trap_indexes == {3, 4}
+
+    redistribution[:] = []
+    assert delta.modified_trap_indexes == frozenset()
@@ -0,0 +1,13 @@
+import pytest
+
+from magiccube.laps.traps.distribute.instrumentation import GenerationTimings
+
+
+def test_external_phases_count_towards_total():
+    timings = GenerationTimings()
+    timings.add_external("queue", 0.5)
+    timings.add("evaluate", 1.0)
+    timings.finish(3.0)
+
+    assert timings.total == 3.5
+    assert timings.as_dict()["phases"] == pytest.approx({"queue": 0.5, "evaluate": 1.0, "selection": 2.0})
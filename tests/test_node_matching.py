@@ -0,0 +1,121 @@
+import itertools
+import random
+import typing as t
+
+import pytest
+from mtgorp.models.persistent.printing import Printing
+from yeetlong.multiset import Multiset
+
+from magiccube.collections.cube import Cube
+from magiccube.collections.delta import CubeDeltaOperation
+from magiccube.collections.infinites import Infinites
+from magiccube.collections.meta import MetaCube
+from magiccube.collections.nodecollection import (
+    ConstrainedNode,
+    GroupMap,
+    NodeCollection,
+    NodesDeltaOperation,
+)
+from magiccube.laps.traps.tree.printingtree import AllNode
+from magiccube.update.cubeupdate import (
+    CubeChange,
+    CubePatch,
+    NodeToPrintings,
+    PrintingsToNode,
+    RemovedCubeable,
+    VerboseCubePatch,
+    _match_nodes_to_printings,
+)
+
+
+def _node(printings: t.Iterable[Printing]) -> ConstrainedNode:
+    return ConstrainedNode(1, AllNode(printings))
+
+
+def _covered(nodes: t.Iterable[ConstrainedNode]) -> int:
+    return sum(len(node.node.children) for node in nodes)
+
+
+def _is_feasible(nodes: t.Iterable[ConstrainedNode], printings: Multiset[Printing]) -> bool:
+    return Multiset(itertools.chain.from_iterable(node.node.children for node in nodes)) <= printings
+
+
+def _optimum(nodes: t.Sequence[ConstrainedNode], printings: Multiset[Printing]) -> int:
+    return max(
+        _covered(subset)
+        for amount in range(len(nodes) + 1)
+        for subset in itertools.combinations(nodes, amount)
+        if _is_feasible(subset, printings)
+    )
+
+
+def _changes(verbose_patch: VerboseCubePatch, change_type: t.Type[CubeChange]) -> t.List[CubeChange]:
+    return [change for change in verbose_patch.changes if isinstance(change, change_type)]
+
+
+@pytest.fixture
+def greedy_trap(printings: t.List[Printing]) -> t.Tuple[t.List[ConstrainedNode], Multiset[Printing]]:
+    """
+    A node taking one printing from each of three smaller nodes, so taking the largest node first covers three
+    printings where the three smaller nodes together cover six.
+    """
+    a, b, c, d, e, f = printings[:6]
+    return [_node((a, b, c)), _node((a, d)), _node((b, e)), _node((c, f))], Multiset((a, b, c, d, e, f))
+
+
+def test_maximum_matching_beats_suboptimal_greedy(greedy_trap):
+    nodes, printings = greedy_trap
+
+    greedy = _match_nodes_to_printings(nodes, printings)
+    maximum = _match_nodes_to_printings(nodes, printings, maximum=True)
+
+    assert _covered(greedy) == 3
+    assert _covered(maximum) == 6
+    assert set(maximum) == set(nodes[1:])
+
+
+def test_maximum_matching_respects_component_size_limit(greedy_trap):
+    nodes, printings = greedy_trap
+
+    assert _match_nodes_to_printings(nodes, printings, maximum=True, component_size_limit=3) == (
+        _match_nodes_to_printings(nodes, printings)
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matching_against_greedy_and_optimum(seed: int, printings: t.List[Printing]):
+    rng = random.Random(seed)
+    pool = printings[:10]
+    available = Multiset(rng.choice(pool) for _ in range(12))
+    nodes = [_node(rng.sample(pool, rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+
+    greedy = _match_nodes_to_printings(nodes, available)
+    maximum = _match_nodes_to_printings(nodes, available, maximum=True)
+
+    assert _is_feasible(greedy, available)
+    assert _is_feasible(maximum, available)
+    assert _covered(greedy) <= _covered(maximum) == _optimum(nodes, available)
+
+
+@pytest.mark.parametrize("maximum_matching, moved", [(False, 3), (True, 6)])
+def test_as_verbose_matching(greedy_trap, maximum_matching: bool, moved: int):
+    nodes, printings = greedy_trap
+    meta_cube = MetaCube(Cube(printings), NodeCollection(()), GroupMap({}), Infinites())
+
+    printings_to_nodes = CubePatch(
+        CubeDeltaOperation({printing: -1 for printing in printings.distinct_elements()}),
+        NodesDeltaOperation({node: 1 for node in nodes}),
+    ).as_verbose(meta_cube, maximum_matching=maximum_matching)
+
+    assert sum(len(change.before) for change in _changes(printings_to_nodes, PrintingsToNode)) == moved
+    assert len(_changes(printings_to_nodes, RemovedCubeable)) == 6 - moved
+
+    nodes_to_printings = CubePatch(
+        CubeDeltaOperation({printing: 1 for printing in printings.distinct_elements()}),
+        NodesDeltaOperation({node: -1 for node in nodes}),
+    ).as_verbose(
+        MetaCube(Cube(), NodeCollection(nodes), GroupMap({}), Infinites()),
+        maximum_matching=maximum_matching,
+    )
+
+    assert sum(len(change.after) for change in _changes(nodes_to_printings, NodeToPrintings)) == moved
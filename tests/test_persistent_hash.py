@@ -0,0 +1,158 @@
+import typing as t
+
+import pytest
+from mtgorp.models.persistent.printing import Printing
+from mtgorp.models.serilization.serializeable import PersistentHashable
+
+from magiccube.collections.cube import Cube
+from magiccube.collections.delta import CubeDeltaOperation
+from magiccube.collections.digest import (
+    PersistentHashVersion,
+    get_persistent_hash_version,
+)
+from magiccube.collections.fantasysets import FantasySet
+from magiccube.collections.infinites import InfinitesDeltaOperation
+from magiccube.collections.nodecollection import (
+    ConstrainedNode,
+    GroupMapDeltaOperation,
+    NodesDeltaOperation,
+)
+from magiccube.laps.traps.trap import Trap
+from magiccube.laps.traps.tree.printingtree import AllNode
+from magiccube.update.cubeupdate import CubePatch
+
+
+class _Chunks(PersistentHashable):
+    """
+    Persistent hash of fixed chunks, for reproducing hashes the way the code computed them before digest hashes.
+    """
+
+    def __init__(self, chunks: t.Iterable[bytes]):
+        self._chunks = list(chunks)
+
+    def _calc_persistent_hash(self) -> t.Iterable[t.ByteString]:
+        return iter(self._chunks)
+
+
+def _baseline_cube_hash(printings: t.Sequence[Printing], traps: t.Sequence[Trap]) -> str:
+    return _Chunks(
+        [str(printing.id).encode("ASCII") for printing in sorted(printings, key=lambda printing: printing.id)]
+        + [persistent_hash.encode("ASCII") for persistent_hash in sorted(trap.persistent_hash() for trap in traps)]
+    ).persistent_hash()
+
+
+def _weighted_chunks(pairs: t.Iterable[t.Tuple[str, int]]) -> t.List[bytes]:
+    return [chunk for key, multiplicity in pairs for chunk in (key.encode("ASCII"), str(multiplicity).encode("ASCII"))]
+
+
+def _baseline_cube_delta_hash(printings: t.Mapping[Printing, int], traps: t.Mapping[Trap, int]) -> str:
+    return _Chunks(
+        _weighted_chunks(
+            (str(printing.id), multiplicity)
+            for printing, multiplicity in sorted(printings.items(), key=lambda pair: pair[0].id)
+        )
+        + _weighted_chunks(sorted((trap.persistent_hash(), multiplicity) for trap, multiplicity in traps.items()))
+    ).persistent_hash()
+
+
+def _baseline_nodes_delta_hash(nodes: t.Mapping[ConstrainedNode, int]) -> str:
+    return _Chunks(
+        _weighted_chunks(sorted((node.persistent_hash(), multiplicity) for node, multiplicity in nodes.items()))
+    ).persistent_hash()
+
+
+@pytest.fixture
+def trap(printings: t.List[Printing]) -> Trap:
+    return Trap(AllNode(printings[10:12]))
+
+
+def test_cube_verifies_baseline_hash(printings: t.List[Printing], trap: Trap):
+    cube = Cube(printings[:4] + [trap])
+    baseline_hash = _baseline_cube_hash(printings[:4], [trap])
+
+    assert cube.persistent_hash() != baseline_hash
+    assert cube.verify_persistent_hash(baseline_hash)
+    assert cube.verify_persistent_hash(cube.persistent_hash())
+    assert not Cube(printings[:3] + [trap]).verify_persistent_hash(baseline_hash)
+
+
+def test_sorted_persistent_hash_version(printings: t.List[Printing], trap: Trap):
+    cube = Cube(printings[:4] + [trap])
+    cube.persistent_hash_version = PersistentHashVersion.SORTED
+
+    assert cube.persistent_hash() == _baseline_cube_hash(printings[:4], [trap])
+
+
+@pytest.fixture
+def node(printings: t.List[Printing]) -> ConstrainedNode:
+    return ConstrainedNode(1, AllNode(printings[20:22]), ["some group"])
+
+
+def _patch(
+    printings: t.List[Printing],
+    trap: Trap,
+    node: ConstrainedNode,
+    group_map_delta_operation: t.Optional[GroupMapDeltaOperation] = None,
+) -> CubePatch:
+    return CubePatch(
+        CubeDeltaOperation({printings[0]: 2, printings[1]: -1, trap: 1}),
+        NodesDeltaOperation({node: -1}),
+        GroupMapDeltaOperation({"some group": 0.5})
+        if group_map_delta_operation is None
+        else group_map_delta_operation,
+        InfinitesDeltaOperation(),
+    )
+
+
+def test_cube_patch_verifies_baseline_hash(printings: t.List[Printing], trap: Trap, node: ConstrainedNode):
+    patch = _patch(printings, trap, node)
+
+    baseline_hash = _Chunks(
+        [
+            _baseline_cube_delta_hash({printings[0]: 2, printings[1]: -1}, {trap: 1}).encode("ASCII"),
+            _baseline_nodes_delta_hash({node: -1}).encode("ASCII"),
+            patch.group_map_delta_operation.persistent_hash().encode("ASCII"),
+            patch.infinites_delta_operation.persistent_hash().encode("ASCII"),
+        ]
+    ).persistent_hash()
+
+    assert get_persistent_hash_version(patch.persistent_hash()) == PersistentHashVersion.DIGEST
+    assert patch.verify_persistent_hash(baseline_hash)
+    assert patch.verify_persistent_hash(patch.persistent_hash())
+    assert not _patch(printings[1:], trap, node).verify_persistent_hash(baseline_hash)
+
+
+def test_cube_patch_digest_hash(printings: t.List[Printing], trap: Trap, node: ConstrainedNode):
+    patch = _patch(printings, trap, node)
+    split = CubePatch(CubeDeltaOperation({printings[0]: 2, trap: 1})) + CubePatch(
+        CubeDeltaOperation({printings[1]: -1}),
+        NodesDeltaOperation({node: -1}),
+        GroupMapDeltaOperation({"some group": 0.5}),
+    )
+
+    assert split.persistent_hash() == patch.persistent_hash()
+    assert (
+        _patch(printings, trap, node, GroupMapDeltaOperation({"some group": 1})).persistent_hash()
+        != patch.persistent_hash()
+    )
+    assert (
+        CubePatch(node_delta_operation=NodesDeltaOperation({node: 1})).persistent_hash()
+        != CubePatch(CubeDeltaOperation({node.node: 1})).persistent_hash()
+    )
+
+
+def test_fantasy_set_verifies_baseline_hash(printings: t.List[Printing], trap: Trap):
+    fantasy_set = FantasySet({"common": Cube(printings[:4]), "rare": Cube([printings[4], trap])})
+
+    baseline_hash = _Chunks(
+        [
+            b"common",
+            _baseline_cube_hash(printings[:4], []).encode("ASCII"),
+            b"rare",
+            _baseline_cube_hash([printings[4]], [trap]).encode("ASCII"),
+        ]
+    ).persistent_hash()
+
+    assert get_persistent_hash_version(fantasy_set.persistent_hash()) == PersistentHashVersion.DIGEST
+    assert fantasy_set.verify_persistent_hash(baseline_hash)
+    assert not FantasySet({"common": Cube(printings[:4])}).verify_persistent_hash(baseline_hash)
@@ -0,0 +1,214 @@
+import random
+import typing as t
+
+import numpy as np
+import pytest
+from evolution import environment
+from evolution.environment import EvolutionModelBlueprint
+
+from magiccube.laps.traps.distribute.algorithm import (
+    DetachedDistributionNode,
+    DistributionNodeTable,
+    Distributor,
+    GroupExclusivityConstraint,
+    ImageAmountHomogeneity,
+    PopulationConstraintSet,
+    SizeHomogeneityConstraint,
+    TrapDistribution,
+    ValueDistributionHomogeneityConstraint,
+)
+from magiccube.laps.traps.distribute.compact import ArrayDistributor
+
+
+TRAP_AMOUNT = 12
+GROUPS = ("a", "b", "c", "d", "e", "f")
+
+
+@pytest.fixture
+def node_table() -> DistributionNodeTable:
+    rng = random.Random(1)
+    return DistributionNodeTable(
+        DetachedDistributionNode(
+            value=rng.choice((0.5, 1.0, 1.5, 2.0, 3.0)),
+            groups=frozenset(rng.sample(GROUPS, rng.randint(0, 3))),
+            image_amount=rng.randint(1, 3),
+        )
+        for _ in range(90)
+    )
+
+
+@pytest.fixture
+def constraints(node_table: DistributionNodeTable) -> t.List:
+    return [
+        ValueDistributionHomogeneityConstraint(node_table.nodes, TRAP_AMOUNT),
+        GroupExclusivityConstraint(node_table.nodes, TRAP_AMOUNT, {"a": 1.0, "b": 0.5}),
+        SizeHomogeneityConstraint(node_table.nodes, TRAP_AMOUNT),
+        ImageAmountHomogeneity(node_table.nodes, TRAP_AMOUNT),
+    ]
+
+
+def _scores(constraints: t.List, distribution: TrapDistribution) -> t.List[float]:
+    return [constraint.score(distribution) for constraint in constraints]
+
+
+def _from_scratch(distribution: TrapDistribution) -> TrapDistribution:
+    return TrapDistribution(traps=[list(trap) for trap in distribution.traps], node_table=distribution.node_table)
+
+
+def _distributor(node_table: DistributionNodeTable, constraints: t.Callable, rng: random.Random) -> Distributor:
+    return Distributor(
+        node_table.nodes,
+        TRAP_AMOUNT,
+        constraints,
+        EvolutionModelBlueprint(environment.SimpleModel, initial_population_size=8),
+        rng=rng,
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_scores_match_from_scratch(
+    seed: int,
+    node_table: DistributionNodeTable,
+    constraints: t.List,
+):
+    rng = random.Random(seed)
+    distributor = _distributor(node_table, lambda distribution: tuple(_scores(constraints, distribution)), rng)
+
+    distribution = distributor.create_individual()
+    other = distributor.create_individual()
+
+    for _ in range(200):
+        operation = rng.random()
+
+        if operation < 0.7:
+            distributor.mutate(distribution)
+
+        elif operation < 0.85:
+            distributor.mate(distribution, other)
+
+        else:
+            # A child sharing the aggregates of the untouched traps of its origin, as deltas produce.
+            distribution = TrapDistribution(
+                traps=[list(trap) for trap in distribution.traps],
+                node_table=distributor.node_table,
+                origin=distribution,
+                origin_indexes=range(TRAP_AMOUNT),
+            )
+
+        # Moves update collision aggregates by row sums, so they may differ from a rescore in rounding.
+        assert _scores(constraints, distribution) == pytest.approx(_scores(constraints, _from_scratch(distribution)))
+
+
+def test_move_updates_collision_aggregates(node_table: DistributionNodeTable):
+    rng = random.Random(0)
+    constraint = GroupExclusivityConstraint(node_table.nodes, TRAP_AMOUNT, {"a": 1.0, "b": 0.5})
+    distribution = TrapDistribution(
+        node_table.nodes,
+        TRAP_AMOUNT,
+        random_initialization=True,
+        node_table=node_table,
+        rng=rng,
+    )
+    constraint.score(distribution)
+
+    for _ in range(100):
+        from_index = rng.choice([index for index, trap in enumerate(distribution.traps) if trap])
+        distribution.move(from_index, rng.randrange(len(distribution.traps[from_index])), rng.randrange(TRAP_AMOUNT))
+
+    assert constraint.group_collision_factor(distribution) == pytest.approx(
+        constraint.group_collision_factor(_from_scratch(distribution))
+    )
+
+
+def test_collision_aggregate_keys_are_not_reused(node_table: DistributionNodeTable):
+    keys = set()
+    for _ in range(10):
+        keys.add(GroupExclusivityConstraint(node_table.nodes, TRAP_AMOUNT, {})._aggregate_key)
+
+    assert len(keys) == 10
+
+
+def test_population_scores_match_single_scores(node_table: DistributionNodeTable, constraints: t.List):
+    rng = random.Random(0)
+    constraint_set = PopulationConstraintSet(zip(constraints, (1, 2, 1, 0.5)))
+    distributions = [
+        TrapDistribution(node_table.nodes, trap_amount, random_initialization=True, node_table=node_table, rng=rng)
+        for trap_amount in (TRAP_AMOUNT, TRAP_AMOUNT + 1) * 8
+    ]
+
+    np.testing.assert_allclose(
+        constraint_set.score_population(distributions),
+        [constraint_set(distribution) for distribution in distributions],
+    )
+
+
+def test_distributor_scores_unevaluated_individuals_in_one_call(
+    node_table: DistributionNodeTable,
+    constraints: t.List,
+    monkeypatch,
+):
+    constraint_set = PopulationConstraintSet((constraint, 1) for constraint in constraints)
+    batch_sizes = []
+    score_population = constraint_set.score_population
+    monkeypatch.setattr(
+        constraint_set,
+        "score_population",
+        lambda distributions: batch_sizes.append(len(distributions)) or score_population(distributions),
+    )
+    distributor = _distributor(node_table, constraint_set, random.Random(0))
+
+    individuals = [distributor._submit_evaluation(distributor.create_individual()) for _ in range(8)]
+    mutated = distributor._submit_evaluation(distributor.mutate(distributor._discard_evaluation(individuals[0])))
+
+    fitnesses = [distributor._evaluate(individual) for individual in individuals]
+
+    assert batch_sizes == [8]
+    assert mutated is individuals[0]
+    np.testing.assert_allclose(fitnesses, [constraint_set(individual) for individual in individuals])
+
+
+def test_evaluate_sets_fitness(node_table: DistributionNodeTable, constraints: t.List):
+    distributor = _distributor(
+        node_table, lambda distribution: tuple(_scores(constraints, distribution)), random.Random(0)
+    )
+    individual = distributor.individual_from_assignment(TRAP_AMOUNT, distributor.create_individual().assignment)
+
+    assert distributor.evaluate(individual).fitness == tuple(_scores(constraints, _from_scratch(individual)))
+
+
+def test_restored_population_is_evaluated(node_table: DistributionNodeTable, constraints: t.List):
+    def evaluate(distribution: TrapDistribution) -> t.Tuple[float, ...]:
+        return tuple(_scores(constraints, distribution))
+
+    distributor = _distributor(node_table, evaluate, random.Random(0))
+    distributor.population[:] = [distributor.evaluate(distributor.create_individual()) for _ in range(4)]
+
+    restored = _distributor(node_table, evaluate, random.Random(1))
+    restored.restore(distributor.snapshot())
+
+    assert [individual.fitness for individual in restored.population] == [
+        individual.fitness for individual in distributor.population
+    ]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_array_scores_match_from_scratch(seed: int, node_table: DistributionNodeTable, constraints: t.List):
+    rng = random.Random(seed)
+    distributor = ArrayDistributor(
+        node_table.nodes,
+        TRAP_AMOUNT,
+        lambda distribution: tuple(_scores(constraints, distribution)),
+        EvolutionModelBlueprint(environment.SimpleModel, initial_population_size=8),
+        rng=rng,
+    )
+    distribution, other = distributor.create_individual(), distributor.create_individual()
+
+    for _ in range(100):
+        if rng.random() < 0.8:
+            distributor.mutate(distribution)
+        else:
+            distributor.mate(distribution, other)
+
+        assert _scores(constraints, distribution) == pytest.approx(
+            _scores(constraints, distribution.as_trap_distribution())
+        )